@@ -6,8 +6,15 @@ from langgraph.prebuilt import create_react_agent
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage, AIMessage
 
-from tools.fastf1 import fastf1_session_summary, fastf1_driver_laps, fastf1_telemetry
-from tools.db import run_sql_query as db_run_sql_query
+from tools.fastf1 import (
+    fastf1_session_summary,
+    fastf1_driver_laps,
+    fastf1_telemetry,
+    fastf1_telemetry_batch,
+)
+from tools.db import sql_query_tool
+from tools.rollups import metric_aggregates
+from tools.timeseries import downsample_sensor
 from tools.strat import read_strategy_yaml
 
 
@@ -76,8 +83,8 @@ def get_justification_agent(model):
         "You are a JUSTIFICATION agent. You receive a proposed strategy change plan produced by the analysis agent.\n"
         "Your job: For EACH change, produce a compact justification that CITES EXACT DATA SOURCES.\n\n"
         "REQUIRED SOURCES PER CHANGE:\n"
-        "- >=1 FastF1 citation using the provided tools (fastf1_driver_laps, fastf1_session_summary, or fastf1_telemetry).\n"
-        "- DB citation ONLY IF you actually call the SQL tool (run_sql_query). If you do not call it, set db_used=false and omit DB sources.\n\n"
+        "- >=1 FastF1 citation using the provided tools (fastf1_driver_laps, fastf1_session_summary, fastf1_telemetry or fastf1_telemetry_batch).\n"
+        "- DB citation ONLY IF you actually call a DB tool (run_sql_query, metric_aggregates or downsample_sensor). If you do not call one, set db_used=false and omit DB sources.\n\n"
         "WHAT TO INCLUDE AS CITATIONS:\n"
         "- For FastF1 tools, include the exact tool name and the params you used (query/year/GP/session, driver, lap indices, channels).\n"
         "- For DB queries, include the exact SQL text you executed.\n"
@@ -96,7 +103,10 @@ def get_justification_agent(model):
             fastf1_session_summary,
             fastf1_driver_laps,
             fastf1_telemetry,
-            db_run_sql_query,
+            fastf1_telemetry_batch,
+            sql_query_tool(),
+            metric_aggregates,
+            downsample_sensor,
             structured_justification_response,
         ],
         prompt=prompt,
@@ -10,12 +10,20 @@ from langchain_core.messages import HumanMessage, AIMessage
 from langchain_groq import ChatGroq
 from langgraph.prebuilt import create_react_agent
 
-from tools.db import run_sql_query as db_run_sql_query
-from tools.fastf1 import fastf1_session_summary, fastf1_driver_laps, fastf1_telemetry
+from tools.db import sql_query_tool
+from tools.rollups import metric_aggregates
+from tools.timeseries import downsample_sensor
+from tools.fastf1 import (
+    fastf1_session_summary,
+    fastf1_driver_laps,
+    fastf1_telemetry,
+    fastf1_telemetry_batch,
+)
+from tools.sim import simulate_strategy_from_lap, simulate_strategy_yaml, sweep_pit_strategies
+from tools.planner import plan_optimal_strategy
 
 from db import load_strategy, save_strategy
 from tools.strat import (
-    _load_schema_obj,
     _validate_yaml_against_schema,
     read_strategy_yaml,
     read_strategy_schema,
@@ -25,6 +33,7 @@ from tools.strat import (
     diff_strategies,
     domain_validate_strategy,
     check_yaml_completeness,
+    validate_strategy_full,
 )
 
 
@@ -66,10 +75,16 @@ def get_analysis_agent(model):
         tools=[
             read_strategy_yaml,
             read_strategy_schema,
-            db_run_sql_query,
+            sql_query_tool(),
+            metric_aggregates,
+            downsample_sensor,
             fastf1_session_summary,
             fastf1_driver_laps,
             fastf1_telemetry,
+            fastf1_telemetry_batch,
+            simulate_strategy_yaml,
+            simulate_strategy_from_lap,
+            sweep_pit_strategies,
         ],
         prompt=(
             "You are an F1 strategy ANALYST. Your job is to analyze a change request and the current strategy.\n"
@@ -78,9 +93,15 @@ def get_analysis_agent(model):
             "- read_strategy_yaml: get the current baseline strategy\n"
             "- read_strategy_schema: get the JSON schema for validation\n"
             "- db_run_sql_query: query team/car/event data\n"
+            "- metric_aggregates: per-lap or per-second min/max/avg/last of metrics sensors\n"
+            "- downsample_sensor: a long sensor trace reduced to a few hundred shape-preserving points\n"
             "- fastf1_session_summary: get F1 session summary data\n"
             "- fastf1_driver_laps: get driver lap data\n"
             "- fastf1_telemetry: get detailed telemetry data\n"
+            "- fastf1_telemetry_batch: per-lap summaries or distance-aligned traces for many laps and drivers at once\n"
+            "- simulate_strategy_yaml: project the total race time of a strategy YAML in microseconds\n"
+            "- simulate_strategy_from_lap: re-project a strategy YAML from the car's current lap, compound, tyre age and fuel\n"
+            "- sweep_pit_strategies: score every pit-lap/compound variation within the pit windows\n"
             "\n"
             "You must begin by invoking read_strategy_yaml to retrieve the current strategy.\n"
             "Do NOT describe the strategy before reading it.\n"
@@ -124,6 +145,8 @@ def get_implementation_agent(model):
             diff_strategies,
             domain_validate_strategy,
             check_yaml_completeness,
+            validate_strategy_full,
+            plan_optimal_strategy,
             structured_strategy_response,
         ],
         prompt=(
@@ -135,8 +158,10 @@ def get_implementation_agent(model):
             "- validate_strategy_yaml: validate your YAML against schema\n"
             "- domain_validate_strategy: check domain logic\n"
             "- check_yaml_completeness: verify all sections present\n"
+            "- validate_strategy_full: completeness, schema and domain checks in ONE call (JSON report)\n"
             "- diff_strategies: compare with baseline\n"
             "- save_updated_strategy: save the final YAML\n"
+            "- plan_optimal_strategy: fill in time-optimal stints and pit laps for a YAML (pass wet_from_lap when rain is expected)\n"
             "\n"
             "YOUR TASK:\n"
             "1. Read the baseline strategy YAML\n"
@@ -153,10 +178,8 @@ def get_implementation_agent(model):
             "\n"
             "CRITICAL REQUIREMENTS:\n"
             "- The YAML must be COMPLETE - include EVERY section\n"
-            "- Use validate_strategy_yaml to check schema compliance\n"
-            "- Use domain_validate_strategy to check logic\n"
-            "- Use check_yaml_completeness to ensure nothing is missing\n"
-            "- Keep iterating until all validations pass\n"
+            "- Use validate_strategy_full to check completeness, schema compliance and logic at once\n"
+            "- Keep iterating until its report has \"ok\": true\n"
             "- The final strategy should have a meaningful name different from default_strategy\n"
             "- Save the final YAML using save_updated_strategy\n"
             "\n"
@@ -381,8 +404,7 @@ if __name__ == "__main__":
     print(f"\nExtracted YAML (first 500 chars):\n{final_yaml_text[:500]}...\n")
 
     ## Final validation and save
-    schema_obj = _load_schema_obj(SCHEMA_PATH)
-    schema_err = _validate_yaml_against_schema(final_yaml_text, schema_obj)
+    schema_err = _validate_yaml_against_schema(final_yaml_text)
     # domain_err = domain_validate_strategy(final_yaml_text)
 
     if schema_err:
@@ -4,15 +4,21 @@ from langchain_community.agent_toolkits import SQLDatabaseToolkit
 
 from langgraph.prebuilt import create_react_agent
 
-# from tools.db import available_tools as db_tools
+# from tools.db import sql_query_tool
 from tools.fastf1 import available_tools as f1_tools
 from tools.strat import read_strategy_yaml
+from tools.montecarlo import simulate_event_scenarios
 
 
 def get_agent(model):
     validator_agent = create_react_agent(
         model=model,
-        tools=[*f1_tools, read_strategy_yaml, structured_validation_response],
+        tools=[
+            *f1_tools,
+            read_strategy_yaml,
+            simulate_event_scenarios,
+            structured_validation_response,
+        ],
         prompt=(
             "You are an expert in formula 1 and a race solution validator agent.\n\n"
             "INSTRUCTIONS:\n"
@@ -25,6 +31,7 @@ def get_agent(model):
             "- Assist ONLY with validation-related tasks. DO NOT generate any new strategies.\n"
             "- Use the data accessible to you in PostgreSQL to validate the efficacy of the proposed change.\n"
             "- Factor in multiple scenarios such as tire performance, risks of pitting early or late, and resilience to unexpected events.\n"
+            "- Use simulate_event_scenarios to compare the mean/P10/P90 race time of the current and changed strategy under safety cars, VSCs and rain.\n"
             "- DO NOT validate strategies that will hurt the team. We want to win.\n"
             "- After you have determined if this change is beneficial, communicate to your supervisor WHY this is beneficial and what they should consider when implementing this strategy.\n"
             "- Be definitive in your answer do not suggest any additional data, if you lack the data necessary you can reject the suggestion but NEVER tell your supervisor they should run more tests\n"
@@ -1,7 +1,7 @@
 from flask import Flask, jsonify, request, Response
 import yaml
 
-from db import list_strategies, load_strategy, save_strategy, remove_strategy
+from db import StrategyNotFound, load_strategy, load_strategies, promote_strategy
 
 # Flask app
 app = Flask(__name__)
@@ -13,30 +13,31 @@ def get_strategies():
 
     Query params:
       - name: optional, return only the named strategy
+      - version: optional with name, return that past revision of it
 
     Response: JSON object with keys: names (list) and strategies (dict name->yaml)
     If `name` is provided and not found, returns 404.
     """
     name = request.args.get("name")
+    version = request.args.get("version", type=int)
 
     try:
         if name:
             # Load single strategy by name
-            strategy = load_strategy(name)
+            strategy = load_strategy(name, version=version)
             yaml_text = yaml.safe_dump(strategy)
             return Response(yaml_text, mimetype="text/yaml")
 
-        # No name provided: list all strategies and return a JSON summary
+        # No name provided: fetch all strategies in one query and return a JSON summary
         strategies_yaml = {}
-        for n in list_strategies():
+        for n, s in load_strategies().items():
             try:
-                s = load_strategy(n)
-                strategies_yaml[n] = yaml.safe_dump(s)
+                strategies_yaml[n] = yaml.safe_dump(s) if s is not None else None
             except Exception:
                 strategies_yaml[n] = None
 
         return jsonify({"strategies": strategies_yaml})
-    except ValueError as e:
+    except StrategyNotFound as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": "internal server error", "detail": str(e)}), 500
@@ -56,18 +57,12 @@ def update_main_strategy():
         if not name:
             return jsonify({"error": "strategy name is required"}), 400
 
-        # Load the strategy to ensure it exists
-        strategy = load_strategy(name)
-        if not strategy:
-            return jsonify({"error": f"strategy '{name}' not found"}), 404
-
-        # Set this strategy as main and remove alternatives
-        save_strategy("default_strategy", strategy)
-        for n in list_strategies():
-            if n != "default_strategy":
-                remove_strategy(n)
+        # Set this strategy as main and remove alternatives in one transaction
+        promote_strategy(name)
 
         return jsonify({"message": f"strategy '{name}' set as main successfully"})
+    except StrategyNotFound:
+        return jsonify({"error": f"strategy '{name}' not found"}), 404
     except Exception as e:
         return jsonify({"error": "internal server error", "detail": str(e)}), 500
 
@@ -0,0 +1,67 @@
+"""Break-even size for running Monte Carlo chunks on the process pool.
+
+Measures the in-process cost per sample x candidate x lap cell and the
+fixed cost of shipping a run's chunks through a warm pool (the same
+`map` call `run_monte_carlo` makes, with the work replaced by a no-op).
+A pool of `w` workers pays off once cells * cost * (1 - 1/w) exceeds
+that overhead. Run from the repository root:
+    python -m benchmarks.montecarlo_parallel
+"""
+import os
+import timeit
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from tools.montecarlo import (
+    CHUNK_SAMPLES,
+    PARALLEL_MIN_CELLS,
+    ScenarioModel,
+    _get_pool,
+    _payload,
+    _run_chunk,
+)
+
+CORPUS = [Path("strategy.yaml"), Path("strategy.updated.yaml")]
+# The simulate_event_scenarios tool's default sample count.
+SAMPLES = 20000
+WORKERS = (2, 4, 8)
+
+
+def _noop(payload, seed, samples, model):
+    return None
+
+
+def best_of(fn, repeat=5):
+    """Return the fastest of `repeat` timings of `fn`, in seconds."""
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+if __name__ == "__main__":
+    docs = [yaml.safe_load(p.read_text(encoding="utf-8")) for p in CORPUS]
+    payload = _payload(docs[0], [d["stints"] for d in docs])
+    model = ScenarioModel()
+    n = -(-SAMPLES // CHUNK_SAMPLES)
+    seeds = np.random.SeedSequence(0).spawn(n)
+    sizes = [CHUNK_SAMPLES] * n
+    cells = SAMPLES * payload["pit"].size
+
+    serial = best_of(lambda: [_run_chunk(payload, s, k, model) for s, k in zip(seeds, sizes)])
+    per_cell = serial / cells
+    print(f"corpus: {', '.join(str(p) for p in CORPUS)}, {SAMPLES} samples, {cells} cells")
+    print(f"in-process: {serial * 1e3:8.2f} ms ({per_cell * 1e9:.1f} ns/cell)")
+    for workers in WORKERS:
+        pool = _get_pool(workers)
+        ship = lambda: list(
+            pool.map(_noop, [payload] * n, seeds, sizes, [model] * n,
+                     chunksize=max(1, n // (workers * 4)))
+        )
+        ship()  # start the workers
+        overhead = best_of(ship)
+        break_even = overhead / (per_cell * (1 - 1 / workers))
+        print(
+            f"{workers} workers: pool overhead {overhead * 1e3:6.2f} ms, "
+            f"break-even {break_even:12,.0f} cells"
+        )
+    print(f"PARALLEL_MIN_CELLS = {PARALLEL_MIN_CELLS:,} (cpu_count {os.cpu_count()})")
@@ -0,0 +1,49 @@
+"""Validations per second over the strategy YAML corpus, before and after schema caching.
+
+Documents are parsed once up front so only the schema step is measured.
+Run from the repository root:
+    python -m benchmarks.schema_validation
+"""
+import json
+import timeit
+from pathlib import Path
+
+import yaml
+from jsonschema import Draft202012Validator, ValidationError
+
+from tools.strat import SCHEMA_PATH, get_schema_validator
+
+CORPUS = [Path("strategy.yaml"), Path("strategy.updated.yaml")]
+
+
+def uncached_validate(data):
+    """The original per-call path: re-read the schema and build a new validator."""
+    schema = json.loads(SCHEMA_PATH.read_text(encoding="utf-8"))
+    try:
+        Draft202012Validator(schema).validate(data)
+    except ValidationError:
+        pass
+
+
+def cached_validate(data):
+    try:
+        get_schema_validator().validate(data)
+    except ValidationError:
+        pass
+
+
+def rate(fn, docs, seconds=2.0):
+    """Return validations per second for `fn` cycling over `docs`."""
+    timer = timeit.Timer(lambda: [fn(d) for d in docs])
+    loops, elapsed = timer.autorange()
+    runs = max(1, int(seconds * loops / elapsed))
+    return runs * len(docs) / timer.timeit(runs)
+
+
+if __name__ == "__main__":
+    docs = [yaml.safe_load(p.read_text(encoding="utf-8")) for p in CORPUS]
+    before = rate(uncached_validate, docs)
+    after = rate(cached_validate, docs)
+    print(f"corpus: {', '.join(str(p) for p in CORPUS)}")
+    print(f"uncached: {before:10.1f} validations/s")
+    print(f"cached:   {after:10.1f} validations/s ({after / before:.2f}x)")
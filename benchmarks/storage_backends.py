@@ -0,0 +1,56 @@
+"""Operations per second for each strategy storage backend.
+
+Runs the same workload against SQLite (a temporary file) and, when
+PG_CONNECTION_STRING is set, Postgres. Only rows named bench_* are touched.
+Run from the repository root:
+    python -m benchmarks.storage_backends
+"""
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+import yaml
+
+from benchmarks.schema_validation import rate
+from db import STRATEGY_CHANNEL, get_cursor
+from storage.postgres import PostgresBackend
+from storage.sqlite import SQLiteBackend
+
+DOCUMENT = yaml.safe_load(Path("strategy.yaml").read_text(encoding="utf-8"))
+NAMES = [f"bench_{i}" for i in range(20)]
+
+
+def changed_document(revision: int) -> dict:
+    """Return DOCUMENT with a small edit, so every save records a new version."""
+    metadata = dict(DOCUMENT.get("metadata", {}) or {}, description=f"bench revision {revision}")
+    return dict(DOCUMENT, metadata=metadata)
+
+
+def workload(backend):
+    """Return (label, fn) pairs; each fn performs one operation per name."""
+    revisions = itertools.count()
+    return [
+        ("save", lambda name: backend.save(name, changed_document(next(revisions)))),
+        ("load", backend.load),
+        ("load_many", lambda name: backend.load_many(NAMES)),
+        ("list_names", lambda name: backend.list_names()),
+    ]
+
+
+def run(backend):
+    for name in NAMES:
+        backend.save(name, DOCUMENT)
+    try:
+        for label, fn in workload(backend):
+            print(f"{backend.name:>8} {label:<10} {rate(fn, NAMES, seconds=1.0):10.1f} ops/s")
+    finally:
+        for name in NAMES:
+            backend.remove(name)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        run(SQLiteBackend(os.path.join(tmp, "bench.sqlite3")))
+    if os.getenv("PG_CONNECTION_STRING"):
+        run(PostgresBackend(get_cursor, notify_channel=STRATEGY_CHANNEL))
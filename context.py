@@ -5,4 +5,14 @@ class Context:
     strategy: str = ""
     event: str = ""
     event_description: str = ""
-    time: str = ""
\ No newline at end of file
+    time: str = ""
+
+
+@dataclass
+class RaceState:
+    """Snapshot of the car on track, used to re-project a strategy mid-race."""
+    current_lap: int = 1
+    compound: str = "Medium"
+    tyre_age_laps: int = 0
+    fuel_mass_kg: float = 0.0
+    elapsed_s: float | None = None
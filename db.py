@@ -1,10 +1,20 @@
 from typing import Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+import copy
+import select
+import threading
+import time
 import psycopg2
 from langchain_core.tools import tool
-from psycopg2.extras import Json
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import os
 
+from storage.base import StrategyBackend, StrategyNotFound
+from storage.postgres import PostgresBackend
+from storage.sqlite import SQLiteBackend
+
 try:
     from dotenv import load_dotenv
 
@@ -12,80 +22,320 @@ try:
 except ModuleNotFoundError:
     pass
 
-db_conn = None
-cur = None
+# psycopg2 keeps at most POOL_MIN_SIZE idle connections open between checkouts;
+# bursts above that open short-lived extra connections up to POOL_MAX_SIZE.
+POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN", "2"))
+POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX", "10"))
+# Connections idle for longer than this are pinged before being handed out.
+HEALTH_CHECK_IDLE_S = float(os.getenv("PG_POOL_HEALTH_CHECK_IDLE_S", "30"))
+# How long a checkout waits for a free connection once POOL_MAX_SIZE are in use.
+CHECKOUT_TIMEOUT_S = float(os.getenv("PG_POOL_TIMEOUT_S", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+_last_used = {}
+
+
+def get_pool() -> Optional[ThreadedConnectionPool]:
+    """Return the process-wide connection pool, creating it on first use.
+
+    Returns None when no PG_CONNECTION_STRING is configured, so importing this
+    module never requires a database.
+    """
+    global _pool
+    if _pool is None and os.getenv("PG_CONNECTION_STRING"):
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    POOL_MIN_SIZE, POOL_MAX_SIZE, os.getenv("PG_CONNECTION_STRING")
+                )
+    return _pool
+
+
+def _is_healthy(conn) -> bool:
+    """Cheap liveness check: closed flag always, a round-trip only after long idles."""
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0.0) < HEALTH_CHECK_IDLE_S:
+        return True
+    try:
+        with conn.cursor() as c:
+            c.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+@contextmanager
+def get_connection():
+    """Check out a healthy pooled connection.
+
+    Blocks while all POOL_MAX_SIZE connections are checked out. Broken
+    connections are discarded and replaced transparently. The transaction is
+    committed when the block exits cleanly and rolled back on error, and the
+    connection is returned to the pool either way.
+    """
+    pool = get_pool()
+    if pool is None:
+        raise RuntimeError("PG_CONNECTION_STRING is not configured.")
+    if not _pool_slots.acquire(timeout=CHECKOUT_TIMEOUT_S):
+        raise psycopg2.OperationalError("Timed out waiting for a pooled database connection.")
+
+    try:
+        for _ in range(POOL_MAX_SIZE + 1):
+            conn = pool.getconn()
+            if _is_healthy(conn):
+                break
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        else:
+            raise psycopg2.OperationalError("Could not obtain a healthy database connection.")
+
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn.closed:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+
+@contextmanager
+def get_cursor():
+    """Yield a RealDictCursor on a pooled connection (see get_connection)."""
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            yield cur
+
+
+# -------- Change notifications ----------
+#
+# One daemon thread per process holds a dedicated LISTEN connection and
+# hands every NOTIFY to the callbacks registered for its channel via
+# listen(). Whenever notifications may have been missed (before the first
+# LISTEN on a channel, or after the connection drops) each callback gets
+# "*", meaning "assume everything changed".
+
+LISTENER_RETRY_S = 5.0
+
+_channels = {}
+_listening = set()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _dispatch(channel: str, payload: str) -> None:
+    for callback in list(_channels.get(channel, ())):
+        callback(payload)
+
+
+def _listen_forever() -> None:
+    """Hold a dedicated LISTEN connection and dispatch notifications as they arrive."""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(os.getenv("PG_CONNECTION_STRING"))
+            conn.autocommit = True
+            while True:
+                # Pick up channels registered since the last pass.
+                for channel in set(_channels) - _listening:
+                    with conn.cursor() as c:
+                        c.execute(f"LISTEN {channel};")
+                    _listening.add(channel)
+                    _dispatch(channel, "*")
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    _dispatch(notify.channel, notify.payload or "*")
+        except Exception:
+            missed = list(_listening)
+            _listening.clear()
+            for channel in missed:
+                _dispatch(channel, "*")
+            time.sleep(LISTENER_RETRY_S)
+        finally:
+            if conn is not None:
+                conn.close()
+
 
+def listen(channel: str, callback) -> bool:
+    """Call `callback(payload)` for every NOTIFY on `channel`; return True while listening.
 
-def initialize_db_connection():
-    """Initialize the database connection and cursor."""
-    global db_conn, cur
-    if db_conn is None or cur is None:
-        db_conn = psycopg2.connect(os.getenv("PG_CONNECTION_STRING"))
-        cur = db_conn.cursor(cursor_factory=RealDictCursor)
+    Registering is idempotent. The first registration of a channel waits
+    briefly for its LISTEN to be in place; callers should only trust caches
+    fed by the channel while this returns True.
+    """
+    global _listener
+    if callback not in _channels.get(channel, ()):
+        with _listener_lock:
+            _channels.setdefault(channel, [])
+            if callback not in _channels[channel]:
+                _channels[channel] = _channels[channel] + [callback]
+            if _listener is None:
+                _listener = threading.Thread(
+                    target=_listen_forever, name="db-notify-listener", daemon=True
+                )
+                _listener.start()
+        deadline = time.monotonic() + 2.0
+        while channel not in _listening and time.monotonic() < deadline:
+            time.sleep(0.01)
+    return channel in _listening
 
 
-# infer the format of the database
-if os.getenv("PG_CONNECTION_STRING"):
-    # Only initialize at import time when a connection string is provided.
-    # This avoids raising errors during local imports when no DB is configured.
-    initialize_db_connection()
+# -------- Strategy read cache ----------
+#
+# With the Postgres backend, load_strategy() is served from an in-process
+# LRU. Every write fires NOTIFY on STRATEGY_CHANNEL inside its transaction
+# (delivered on commit), and the listener evicts the named entry ("*" clears
+# everything) in every process. The cache only serves hits while the
+# listener is connected; after a reconnect it starts empty, since
+# notifications may have been missed while it was down.
 
-# CREATE TABLE strategies (
-#     id SERIAL PRIMARY KEY,
-#     name TEXT NOT NULL,
-#     details JSONB
-# );
+STRATEGY_CACHE_SIZE = int(os.getenv("STRATEGY_CACHE_SIZE", "256"))
+STRATEGY_CHANNEL = "strategies_changed"
 
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_generation = 0
 
-def load_strategy(strategy_name: str) -> dict:
-    """Load a strategy from the database by name."""
-    if not cur:
-        return {}
-    cur.execute("SELECT details FROM strategies WHERE name = %s;", (strategy_name,))
-    strategy = cur.fetchone()
 
-    if strategy:
-        return dict(strategy["details"])
-    else:
-        raise ValueError(f"Strategy '{strategy_name}' not found.")
+def _invalidate(name: str) -> None:
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        if name == "*":
+            _cache.clear()
+        else:
+            _cache.pop(name, None)
+
+
+def _ensure_listener() -> bool:
+    """Subscribe the cache to invalidations; return True if the cache may serve hits."""
+    if STRATEGY_CACHE_SIZE <= 0:
+        return False
+    return listen(STRATEGY_CHANNEL, _invalidate)
+
+
+# -------- Storage backend ----------
+#
+# STRATEGY_BACKEND picks where strategies live: "postgres" (the shared
+# deployment) or "sqlite" (a local file at STRATEGY_SQLITE_PATH, for running
+# the API and agents on a laptop without a server). It defaults to postgres
+# when PG_CONNECTION_STRING is set and sqlite otherwise.
+
+SQLITE_PATH = os.getenv("STRATEGY_SQLITE_PATH", "strategies.sqlite3")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StrategyBackend:
+    """Return the process-wide strategy storage backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = os.getenv("STRATEGY_BACKEND") or (
+                    "postgres" if os.getenv("PG_CONNECTION_STRING") else "sqlite"
+                )
+                if kind == "postgres":
+                    _backend = PostgresBackend(get_cursor, notify_channel=STRATEGY_CHANNEL)
+                elif kind == "sqlite":
+                    _backend = SQLiteBackend(SQLITE_PATH)
+                else:
+                    raise ValueError(f"Unknown STRATEGY_BACKEND '{kind}'.")
+    return _backend
+
+
+def load_strategy(strategy_name: str, version: Optional[int] = None) -> dict:
+    """Load a strategy by name, via the read-through cache when the backend supports it.
+
+    With `version`, rebuild that past revision from the version history
+    instead (see list_strategy_versions).
+    """
+    backend = get_backend()
+    if version is not None:
+        details = backend.load_version(strategy_name, version)
+        if details is None:
+            raise StrategyNotFound(f"Strategy '{strategy_name}' has no version {version}.")
+        return details
+
+    cached = backend.notifies_writes and _ensure_listener()
+    if cached:
+        with _cache_lock:
+            if strategy_name in _cache:
+                _cache.move_to_end(strategy_name)
+                return copy.deepcopy(_cache[strategy_name])
+            generation = _cache_generation
+
+    details = backend.load(strategy_name)
+    if details is None:
+        raise StrategyNotFound(f"Strategy '{strategy_name}' not found.")
+
+    if cached:
+        with _cache_lock:
+            # Skip the fill if anything was invalidated while we were reading.
+            if generation == _cache_generation:
+                _cache[strategy_name] = copy.deepcopy(details)
+                if len(_cache) > STRATEGY_CACHE_SIZE:
+                    _cache.popitem(last=False)
+    return details
+
+
+def load_strategies(names: Optional[list] = None) -> dict:
+    """Load several strategies in one query, as a dict of name -> details.
+
+    With no names, every stored strategy is returned. Names that do not exist
+    are simply absent from the result.
+    """
+    return get_backend().load_many(names)
 
 
 def save_strategy(strategy_name: str, strategy_details: dict) -> None:
-    """Save a strategy to the database."""
-    if not cur or not db_conn:
-        return
+    """Save a strategy as its newest revision; earlier revisions stay loadable."""
+    get_backend().save(strategy_name, strategy_details)
+    _invalidate(strategy_name)
 
-    cur.execute(
-        """
-        INSERT INTO strategies (name, details)
-        VALUES (%s, %s)
-        ON CONFLICT (name) DO UPDATE SET details = EXCLUDED.details;
-        """,
-        (strategy_name, Json(strategy_details)),
-    )
-    db_conn.commit()
 
+def promote_strategy(strategy_name: str, main_name: str = "default_strategy") -> None:
+    """Make a strategy the main one and delete every other row, atomically.
+
+    The upsert of `main_name` and the prune run in one transaction, so
+    promotion never leaves a half-pruned table. Raises StrategyNotFound if
+    the strategy does not exist.
+    """
+    promoted = get_backend().promote(strategy_name, main_name)
+    _invalidate("*")
+    if not promoted:
+        raise StrategyNotFound(f"Strategy '{strategy_name}' not found.")
 
-def remove_strategy(strategy_name: str) -> None:
-    """Remove a strategy from the database by name."""
-    if not cur or not db_conn:
-        return
 
-    cur.execute(
-        "DELETE FROM strategies WHERE name = %s;",
-        (strategy_name,),
-    )
-    db_conn.commit()
+def remove_strategy(strategy_name: str) -> None:
+    """Remove a strategy by name."""
+    get_backend().remove(strategy_name)
+    _invalidate(strategy_name)
 
 
 def list_strategies() -> list:
-    """Return a list of strategy names stored in the database."""
-    if not cur:
-        return []
-    cur.execute("SELECT name FROM strategies;")
-    rows = cur.fetchall()
-    # rows are RealDict rows like {'name': 'default_strategy'}
-    return [r["name"] for r in rows]
+    """Return a list of stored strategy names."""
+    return get_backend().list_names()
+
+
+def list_strategy_versions(strategy_name: str) -> list:
+    """Return the revision history of a strategy as [{"version", "kind", "created_at"}]."""
+    return get_backend().list_versions(strategy_name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class StrategyNotFound(ValueError):
+    """Raised when a strategy, or the requested version of one, does not exist."""
+
+
+class StrategyBackend(ABC):
+    """Storage for strategy documents keyed by name.
+
+    db.py's load_strategy/save_strategy/list_strategies/remove_strategy and
+    friends delegate to one of these.
+    """
+
+    name = "abstract"
+    # True if writes are announced to other processes (see db.py's read cache).
+    notifies_writes = False
+
+    @abstractmethod
+    def load(self, name: str) -> Optional[dict]:
+        """Return the stored details, or None if there is no such strategy."""
+
+    @abstractmethod
+    def load_many(self, names: Optional[list] = None) -> dict:
+        """Return name -> details for the given names (all strategies if None) in one query."""
+
+    @abstractmethod
+    def save(self, name: str, details: dict) -> None:
+        """Insert or replace a strategy and append it to the version history.
+
+        Saving a document identical to the current one records nothing.
+        """
+
+    @abstractmethod
+    def load_version(self, name: str, version: int) -> Optional[dict]:
+        """Rebuild a past revision from the version history, or None if it does not exist."""
+
+    @abstractmethod
+    def list_versions(self, name: str) -> list:
+        """Return [{"version", "kind", "created_at"}] for every stored revision, oldest first."""
+
+    @abstractmethod
+    def remove(self, name: str) -> None:
+        """Delete a strategy and its version history; missing names are ignored."""
+
+    @abstractmethod
+    def list_names(self) -> list:
+        """Return the names of all stored strategies."""
+
+    @abstractmethod
+    def promote(self, name: str, main_name: str) -> bool:
+        """Copy `name` to `main_name` and delete every other row in one transaction.
+
+        The copy is recorded as a new snapshot revision of `main_name`, unless
+        it equals `main_name`'s current content.
+
+        Returns False (and changes nothing) if `name` does not exist.
+        """
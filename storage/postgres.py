@@ -0,0 +1,191 @@
+from typing import Optional
+
+from psycopg2.extras import Json
+
+from storage.base import StrategyBackend
+from storage.versions import make_revision, replay
+
+# CREATE TABLE strategies (
+#     id SERIAL PRIMARY KEY,
+#     name TEXT NOT NULL UNIQUE,
+#     details JSONB
+# );
+
+VERSIONS_DDL = """
+CREATE TABLE IF NOT EXISTS strategy_versions (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('snapshot', 'delta')),
+    body JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (name, version)
+);
+"""
+
+
+def install_schema(cur) -> None:
+    """Create strategy_versions. Needs CREATE on public, so setup runs it (python -m tools.db)."""
+    cur.execute(VERSIONS_DDL)
+
+
+class PostgresBackend(StrategyBackend):
+    """Strategies in a Postgres `strategies` table, over pooled connections.
+
+    `cursor_factory` is a context manager yielding a RealDictCursor whose
+    transaction commits on clean exit (db.get_cursor). When `notify_channel`
+    is set, every write queues a NOTIFY with the affected name ("*" for all)
+    that is delivered on commit.
+    """
+
+    name = "postgres"
+
+    def __init__(self, cursor_factory, notify_channel: Optional[str] = None):
+        self._cursor = cursor_factory
+        self._channel = notify_channel
+        self.notifies_writes = notify_channel is not None
+        with self._cursor() as cur:
+            cur.execute("SELECT to_regclass('strategy_versions') IS NOT NULL AS present;")
+            present = cur.fetchone()["present"]
+        if not present:
+            raise RuntimeError(
+                "Table strategy_versions is missing; run `python -m tools.db` with a role that can create it."
+            )
+
+    def _notify(self, cur, name: str) -> None:
+        if self._channel:
+            cur.execute("SELECT pg_notify(%s, %s);", (self._channel, name))
+
+    def load(self, name):
+        with self._cursor() as cur:
+            cur.execute("SELECT details FROM strategies WHERE name = %s;", (name,))
+            row = cur.fetchone()
+        return dict(row["details"]) if row else None
+
+    def load_many(self, names=None):
+        with self._cursor() as cur:
+            if names is None:
+                cur.execute("SELECT name, details FROM strategies;")
+            else:
+                cur.execute(
+                    "SELECT name, details FROM strategies WHERE name = ANY(%s);",
+                    (list(names),),
+                )
+            rows = cur.fetchall()
+        return {r["name"]: dict(r["details"]) if r["details"] is not None else None for r in rows}
+
+    def save(self, name, details):
+        with self._cursor() as cur:
+            # Serialise writers per name so version numbers stay dense.
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (name,))
+            cur.execute(
+                """
+                SELECT (SELECT details FROM strategies WHERE name = %(name)s) AS details,
+                       (SELECT coalesce(max(version), 0) FROM strategy_versions
+                        WHERE name = %(name)s) AS version;
+                """,
+                {"name": name},
+            )
+            head = cur.fetchone()
+            version = head["version"] + 1
+            revision = make_revision(head["details"], details, version)
+            if revision is None:
+                return
+            cur.execute(
+                "INSERT INTO strategy_versions (name, version, kind, body) VALUES (%s, %s, %s, %s);",
+                (name, version, revision[0], Json(revision[1])),
+            )
+            cur.execute(
+                """
+                INSERT INTO strategies (name, details)
+                VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET details = EXCLUDED.details;
+                """,
+                (name, Json(details)),
+            )
+            self._notify(cur, name)
+
+    def load_version(self, name, version):
+        with self._cursor() as cur:
+            cur.execute(
+                """
+                SELECT kind, body FROM strategy_versions
+                WHERE name = %(name)s AND version <= %(version)s
+                  AND version >= (
+                      SELECT max(version) FROM strategy_versions
+                      WHERE name = %(name)s AND version <= %(version)s AND kind = 'snapshot'
+                  )
+                  AND EXISTS (
+                      SELECT 1 FROM strategy_versions WHERE name = %(name)s AND version = %(version)s
+                  )
+                ORDER BY version;
+                """,
+                {"name": name, "version": version},
+            )
+            rows = cur.fetchall()
+        return replay((r["kind"], r["body"]) for r in rows) if rows else None
+
+    def list_versions(self, name):
+        with self._cursor() as cur:
+            cur.execute(
+                "SELECT version, kind, created_at FROM strategy_versions"
+                " WHERE name = %s ORDER BY version;",
+                (name,),
+            )
+            rows = cur.fetchall()
+        return [
+            {"version": r["version"], "kind": r["kind"], "created_at": r["created_at"].isoformat()}
+            for r in rows
+        ]
+
+    def remove(self, name):
+        with self._cursor() as cur:
+            cur.execute("DELETE FROM strategies WHERE name = %s;", (name,))
+            cur.execute("DELETE FROM strategy_versions WHERE name = %s;", (name,))
+            self._notify(cur, name)
+
+    def list_names(self):
+        with self._cursor() as cur:
+            cur.execute("SELECT name FROM strategies;")
+            rows = cur.fetchall()
+        # rows are RealDict rows like {'name': 'default_strategy'}
+        return [r["name"] for r in rows]
+
+    def promote(self, name, main_name):
+        # The upsert, its snapshot revision and the prune are one statement
+        # (data-modifying CTEs) in one transaction.
+        with self._cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (main_name,))
+            cur.execute(
+                """
+                WITH source AS (
+                    SELECT details FROM strategies WHERE name = %(name)s
+                ), promoted AS (
+                    INSERT INTO strategies (name, details)
+                    SELECT %(main)s, details FROM source
+                    ON CONFLICT (name) DO UPDATE SET details = EXCLUDED.details
+                    RETURNING name
+                ), versioned AS (
+                    INSERT INTO strategy_versions (name, version, kind, body)
+                    SELECT %(main)s,
+                           coalesce((SELECT max(version) FROM strategy_versions
+                                     WHERE name = %(main)s), 0) + 1,
+                           'snapshot', coalesce(details, 'null'::jsonb)
+                    FROM source
+                    -- Promoting the current content records nothing, like an identical save.
+                    WHERE details IS DISTINCT FROM (
+                        SELECT details FROM strategies WHERE name = %(main)s
+                    )
+                    RETURNING version
+                ), pruned AS (
+                    DELETE FROM strategies
+                    WHERE name <> %(main)s AND EXISTS (SELECT 1 FROM source)
+                    RETURNING name
+                )
+                SELECT (SELECT count(*) FROM promoted) AS promoted,
+                       (SELECT count(*) FROM pruned) AS pruned;
+                """,
+                {"name": name, "main": main_name},
+            )
+            result = cur.fetchone()
+            self._notify(cur, "*")
+        return bool(result["promoted"])
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from storage.base import StrategyBackend
+from storage.versions import make_revision, replay
+
+
+class SQLiteBackend(StrategyBackend):
+    """Strategies in an embedded SQLite file (WAL mode, JSON1-validated details).
+
+    Each thread gets its own connection; WAL lets readers run alongside the
+    single writer, including across processes sharing the file.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS strategies (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    details TEXT CHECK (details IS NULL OR json_valid(details))
+                );
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS strategy_versions (
+                    name TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    kind TEXT NOT NULL CHECK (kind IN ('snapshot', 'delta')),
+                    body TEXT NOT NULL CHECK (json_valid(body)),
+                    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+                    PRIMARY KEY (name, version)
+                ) WITHOUT ROWID;
+                """
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            yield conn
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            raise
+
+    def load(self, name):
+        row = self._conn().execute(
+            "SELECT details FROM strategies WHERE name = ?;", (name,)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def load_many(self, names=None):
+        if names is None:
+            rows = self._conn().execute("SELECT name, details FROM strategies;")
+        else:
+            rows = self._conn().execute(
+                "SELECT name, details FROM strategies"
+                " WHERE name IN (SELECT value FROM json_each(?));",
+                (json.dumps(list(names)),),
+            )
+        return {n: json.loads(d) if d is not None else None for n, d in rows}
+
+    def _append_version(self, conn, name, kind, body, version=None) -> None:
+        if version is None:
+            (version,) = conn.execute(
+                "SELECT coalesce(max(version), 0) + 1 FROM strategy_versions WHERE name = ?;",
+                (name,),
+            ).fetchone()
+        conn.execute(
+            "INSERT INTO strategy_versions (name, version, kind, body) VALUES (?, ?, ?, json(?));",
+            (name, version, kind, json.dumps(body)),
+        )
+
+    def save(self, name, details):
+        # BEGIN IMMEDIATE takes the write lock up front, so reading the head
+        # and appending the next version cannot interleave with another writer.
+        with self._transaction() as conn:
+            head = conn.execute(
+                """
+                SELECT (SELECT details FROM strategies WHERE name = ?1),
+                       (SELECT coalesce(max(version), 0) FROM strategy_versions WHERE name = ?1);
+                """,
+                (name,),
+            ).fetchone()
+            parent = json.loads(head[0]) if head[0] is not None else None
+            revision = make_revision(parent, details, head[1] + 1)
+            if revision is None:
+                return
+            self._append_version(conn, name, *revision, version=head[1] + 1)
+            conn.execute(
+                """
+                INSERT INTO strategies (name, details)
+                VALUES (?, json(?))
+                ON CONFLICT (name) DO UPDATE SET details = excluded.details;
+                """,
+                (name, json.dumps(details)),
+            )
+
+    def load_version(self, name, version):
+        rows = self._conn().execute(
+            """
+            SELECT kind, body FROM strategy_versions
+            WHERE name = ?1 AND version <= ?2
+              AND version >= (
+                  SELECT max(version) FROM strategy_versions
+                  WHERE name = ?1 AND version <= ?2 AND kind = 'snapshot'
+              )
+              AND EXISTS (SELECT 1 FROM strategy_versions WHERE name = ?1 AND version = ?2)
+            ORDER BY version;
+            """,
+            (name, version),
+        ).fetchall()
+        return replay((kind, json.loads(body)) for kind, body in rows) if rows else None
+
+    def list_versions(self, name):
+        rows = self._conn().execute(
+            "SELECT version, kind, created_at FROM strategy_versions"
+            " WHERE name = ? ORDER BY version;",
+            (name,),
+        )
+        return [{"version": v, "kind": k, "created_at": c} for v, k, c in rows]
+
+    def remove(self, name):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM strategies WHERE name = ?;", (name,))
+            conn.execute("DELETE FROM strategy_versions WHERE name = ?;", (name,))
+
+    def list_names(self):
+        return [r[0] for r in self._conn().execute("SELECT name FROM strategies;")]
+
+    def promote(self, name, main_name):
+        with self._transaction() as conn:
+            source = conn.execute(
+                "SELECT details FROM strategies WHERE name = ?;", (name,)
+            ).fetchone()
+            if not source:
+                return False
+            head = conn.execute(
+                "SELECT details FROM strategies WHERE name = ?;", (main_name,)
+            ).fetchone()
+            document = json.loads(source[0] or "null")
+            # Promoting the current content records nothing, like an identical save.
+            if head is None or json.loads(head[0] or "null") != document:
+                self._append_version(conn, main_name, "snapshot", document)
+            conn.execute(
+                """
+                INSERT INTO strategies (name, details)
+                SELECT ?, details FROM strategies WHERE name = ?
+                ON CONFLICT (name) DO UPDATE SET details = excluded.details;
+                """,
+                (main_name, name),
+            )
+            conn.execute("DELETE FROM strategies WHERE name <> ?;", (main_name,))
+        return True
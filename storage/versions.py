@@ -0,0 +1,39 @@
+import json
+import os
+
+import jsonpatch
+
+# Every SNAPSHOT_EVERY-th revision of a strategy stores the full document;
+# the ones in between store a JSON-patch against their parent. Rebuilding
+# any version therefore replays at most SNAPSHOT_EVERY - 1 patches.
+SNAPSHOT_EVERY = int(os.getenv("STRATEGY_SNAPSHOT_EVERY", "16"))
+
+
+def make_revision(parent, details: dict, version: int):
+    """Return (kind, body) to store `details` as `version`, or None if nothing changed.
+
+    `parent` is the document at version - 1 (None if the strategy has no live
+    head). Falls back to a snapshot whenever the patch would not be smaller.
+    """
+    if parent is not None and parent == details:
+        return None
+    if parent is None or (version - 1) % SNAPSHOT_EVERY == 0:
+        return "snapshot", details
+    patch = jsonpatch.make_patch(parent, details).patch
+    if len(json.dumps(patch)) >= len(json.dumps(details)):
+        return "snapshot", details
+    return "delta", patch
+
+
+def replay(rows) -> dict:
+    """Rebuild a document from (kind, body) rows ordered by version, starting at a snapshot."""
+    rows = iter(rows)
+    kind, document = next(rows)
+    if kind != "snapshot":
+        raise ValueError("Version history does not start with a snapshot.")
+    for kind, body in rows:
+        if kind == "snapshot":
+            document = body
+        else:
+            document = jsonpatch.apply_patch(document, body, in_place=True)
+    return document
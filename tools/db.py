@@ -1,9 +1,19 @@
+import csv
+import hashlib
+import io
+import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 
 import psycopg2
 from langchain_core.tools import tool
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
-from db import cur
+from db import get_connection, get_cursor, listen
+from storage.postgres import install_schema
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -11,6 +21,128 @@ except ModuleNotFoundError:
     pass
 
 
+# run_sql_query streams results from a server-side cursor and stops at
+# whichever budget runs out first; anything left is counted, not fetched.
+RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "1000"))
+RESULT_MAX_CHARS = int(os.getenv("SQL_RESULT_MAX_CHARS", "10000"))
+FETCH_BATCH_ROWS = 200
+STREAM_CURSOR_NAME = "run_sql_query_stream"
+
+# Every agent query runs in a READ ONLY transaction with a statement
+# timeout. Row-returning statements get their top-level LIMIT injected or
+# clamped to QUERY_MAX_ROWS and are rejected if the planner's estimated
+# total cost (after the LIMIT) exceeds QUERY_MAX_COST.
+QUERY_MAX_ROWS = int(os.getenv("SQL_QUERY_MAX_ROWS", "500"))
+QUERY_MAX_COST = float(os.getenv("SQL_QUERY_MAX_COST", "500000"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+ROW_RETURNING = ("select", "with", "values", "table")
+
+_SQL_TOKEN = re.compile(
+    r"""
+      (?P<space>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<string>[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<dollar>\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?\$(?P=tag)\$)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+    | (?P<word>[A-Za-z_][\w$]*)
+    | (?P<op>.)
+    """,
+    re.S | re.X,
+)
+
+# Read-query results are cached in-process, keyed by the normalised query
+# (comments and whitespace dropped, keywords and identifiers lower-cased,
+# literals untouched). Entries expire after RESULT_CACHE_TTL_S and are
+# evicted LRU beyond RESULT_CACHE_SIZE. A statement-level trigger on each
+# table NOTIFYs TABLE_CHANGED_CHANNEL with the table name on every write,
+# evicting the entries that read it. The triggers are installed by the
+# setup step (python -m tools.db), never from the query path; the list of
+# tables that have it is re-read every NOTIFY_RELOAD_S. High-rate ingest
+# tables (INGEST_TABLES) get no trigger, since NOTIFY serialises commits.
+# Results reading them live for at most INGEST_CACHE_TTL_S and are only
+# served while max(<time column>) of each is unchanged, which catches
+# appends. Queries reading any other table without the trigger, a view or a
+# system catalog, or calling volatile functions, are never cached; neither
+# are queries that read no known table at all.
+RESULT_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL_S = float(os.getenv("SQL_CACHE_TTL_S", "300"))
+TABLE_CHANGED_CHANNEL = "tables_changed"
+TABLE_TRIGGER_NAME = "notify_tables_changed"
+NOTIFY_RELOAD_S = float(os.getenv("SQL_CACHE_NOTIFY_RELOAD_S", "60"))
+# "table:time_column" pairs, comma separated.
+INGEST_TABLES = dict(
+    pair.strip().split(":", 1)
+    for pair in os.getenv("SQL_CACHE_INGEST_TABLES", "metrics:time").split(",")
+    if ":" in pair
+)
+INGEST_CACHE_TTL_S = float(os.getenv("SQL_CACHE_INGEST_TTL_S", "30"))
+SYSTEM_SCHEMAS = {"information_schema", "pg_catalog"}
+VOLATILE_FUNCTIONS = {
+    "now", "random", "clock_timestamp", "statement_timestamp", "transaction_timestamp",
+    "timeofday", "current_date", "current_time", "current_timestamp", "localtime",
+    "localtimestamp", "nextval", "currval", "setval", "gen_random_uuid", "pg_sleep",
+}
+
+TABLE_NOTIFY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION {TABLE_TRIGGER_NAME}() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('{TABLE_CHANGED_CHANNEL}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+"""
+
+_results = OrderedDict()
+_results_lock = threading.Lock()
+_results_generation = 0
+_notifying_tables = None
+
+# Introspection is cached on disk so agent start-up does not hit the
+# database. Within SCHEMA_CACHE_TTL_S the cache is used as-is; after that a
+# single fingerprint query over information_schema decides whether the table
+# list must be re-read. SCHEMA_CACHE_FORMAT is bumped whenever the cached
+# shape changes.
+SCHEMA_CACHE_PATH = os.getenv("DB_SCHEMA_CACHE_PATH") or os.path.expanduser(
+    "~/.cache/hacktx25/db_schema.json"
+)
+SCHEMA_CACHE_TTL_S = float(os.getenv("DB_SCHEMA_CACHE_TTL_S", "3600"))
+SCHEMA_CACHE_FORMAT = 1
+
+# metric_sensors is a catalog of every sensor_name ever written to metrics,
+# kept up to date by statement-level triggers so nothing has to scan metrics.
+# Deleting a sensor's last row does not remove it from the catalog.
+SENSOR_CATALOG_DDL = """
+CREATE TABLE IF NOT EXISTS metric_sensors (
+    sensor_name TEXT PRIMARY KEY,
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION metric_sensors_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO metric_sensors (sensor_name)
+    SELECT DISTINCT sensor_name FROM new_rows WHERE sensor_name IS NOT NULL
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS metric_sensors_on_insert ON metrics;
+CREATE TRIGGER metric_sensors_on_insert
+    AFTER INSERT ON metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION metric_sensors_sync();
+
+DROP TRIGGER IF EXISTS metric_sensors_on_update ON metrics;
+CREATE TRIGGER metric_sensors_on_update
+    AFTER UPDATE ON metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION metric_sensors_sync();
+"""
+
+_schema_lock = threading.Lock()
+
+
 def get_table_names(conn):
     """Return a list of table names."""
     table_names = []
@@ -44,75 +176,464 @@ def get_column_names(conn, table_name):
             column_names.append(col[0])
     return column_names
 
+def install_sensor_catalog(conn):
+    """Create metric_sensors and its triggers, backfilling it once from metrics."""
+    conn.execute("SELECT to_regclass('public.metric_sensors') IS NOT NULL AS present;")
+    present = conn.fetchone()["present"]
+    conn.execute(SENSOR_CATALOG_DDL)
+    if not present:
+        conn.execute(
+            "INSERT INTO metric_sensors (sensor_name)"
+            " SELECT DISTINCT sensor_name FROM metrics WHERE sensor_name IS NOT NULL"
+            " ON CONFLICT DO NOTHING;"
+        )
+
 def get_metric_sensors(conn):
-    """Return a list of sensors that are currently in the database"""
-    sensors = []
+    """Return a list of sensors that are currently in the database.
+
+    Reads the metric_sensors catalog installed by `python -m tools.db`; until
+    then falls back to scanning metrics. Returns None if neither can be read.
+    """
+    conn.execute("SELECT to_regclass('public.metric_sensors') IS NOT NULL AS present;")
+    if conn.fetchone()["present"]:
+        conn.execute("SELECT sensor_name FROM metric_sensors ORDER BY sensor_name;")
+        return [row["sensor_name"] for row in conn.fetchall()]
+    # Keep the transaction usable if metrics is missing too.
+    conn.execute("SAVEPOINT sensor_scan;")
+    try:
+        conn.execute(
+            "SELECT DISTINCT sensor_name FROM metrics"
+            " WHERE sensor_name IS NOT NULL ORDER BY sensor_name;"
+        )
+    except psycopg2.Error:
+        conn.execute("ROLLBACK TO SAVEPOINT sensor_scan;")
+        return None
+    sensors = [row["sensor_name"] for row in conn.fetchall()]
+    conn.execute("RELEASE SAVEPOINT sensor_scan;")
+    return sensors
+
+def get_schema_fingerprint(conn):
+    """Return a hash of every public table and column, cheap enough to poll."""
     conn.execute(
-        "SELECT DISTINCT(sensor_name) FROM metrics;"
+        """
+        SELECT md5(coalesce(string_agg(table_name || '.' || column_name || ':' || data_type,
+                                       ',' ORDER BY table_name, ordinal_position), '')) AS fingerprint
+        FROM information_schema.columns WHERE table_schema = 'public';
+        """
     )
-    
-    for row in  conn.fetchall():
-        sensors.append(row['sensor_name'])
-    return list(set(sensors))
+    return conn.fetchone()["fingerprint"]
 
 def get_database_info(conn):
     """Return a list of dicts containing the table name and columns for each table in the database."""
-    table_dicts = []
-    for table_name in get_table_names(conn):
-        columns_names = get_column_names(conn, table_name)
-        table_dicts.append({"table_name": table_name, "column_names": columns_names})
-    return table_dicts
-
-database_schema_dict = get_database_info(cur)
-database_schema_string = "\n".join(
-    [
-        f"Table: {table['table_name']}\nColumns: {', '.join(table['column_names'])}"
-        for table in database_schema_dict
+    conn.execute(
+        """
+        SELECT c.table_name, array_agg(c.column_name::text ORDER BY c.ordinal_position) AS column_names
+        FROM information_schema.columns c
+        JOIN information_schema.tables t
+          ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+        WHERE c.table_schema = 'public' AND t.table_type = 'BASE TABLE'
+        GROUP BY c.table_name
+        ORDER BY c.table_name;
+        """
+    )
+    return [dict(row) for row in conn.fetchall()]
+
+def _read_schema_cache():
+    try:
+        with open(SCHEMA_CACHE_PATH, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stamp = hashlib.sha256(os.getenv("PG_CONNECTION_STRING", "").encode("utf-8")).hexdigest()
+    if cached.get("format") != SCHEMA_CACHE_FORMAT or cached.get("database") != stamp:
+        return None
+    return cached
+
+def _write_schema_cache(cached):
+    cached["format"] = SCHEMA_CACHE_FORMAT
+    cached["database"] = hashlib.sha256(
+        os.getenv("PG_CONNECTION_STRING", "").encode("utf-8")
+    ).hexdigest()
+    cached["checked_at"] = time.time()
+    os.makedirs(os.path.dirname(SCHEMA_CACHE_PATH), exist_ok=True)
+    tmp = f"{SCHEMA_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cached, f)
+    os.replace(tmp, SCHEMA_CACHE_PATH)
+
+def describe_database(refresh: bool = False) -> dict:
+    """Return {"tables": [...], "sensors": [...]}, from the disk cache when it is fresh."""
+    with _schema_lock:
+        cached = None if refresh else _read_schema_cache()
+        if cached and time.time() - cached["checked_at"] < SCHEMA_CACHE_TTL_S:
+            return cached
+
+        with get_cursor() as cur:
+            sensors = get_metric_sensors(cur)
+            if sensors is None:
+                sensors = cached["sensors"] if cached else []
+            fingerprint = get_schema_fingerprint(cur)
+            if not cached or cached.get("fingerprint") != fingerprint:
+                tables = get_database_info(cur)
+            else:
+                tables = cached["tables"]
+        cached = {"fingerprint": fingerprint, "tables": tables, "sensors": sensors}
+        _write_schema_cache(cached)
+        return cached
+
+def _sql_tokens(query):
+    """Yield (kind, text, start, end, depth) for every significant token of `query`."""
+    depth = 0
+    for m in _SQL_TOKEN.finditer(query):
+        kind = m.lastgroup if m.lastgroup != "tag" else "dollar"
+        if kind in ("space", "comment"):
+            continue
+        text = m.group()
+        if text == ")":
+            depth -= 1
+        yield kind, text, m.start(), m.end(), depth
+        if text == "(":
+            depth += 1
+
+
+def returns_rows(query: str) -> bool:
+    """True for SELECT-like statements (SELECT, WITH, VALUES, TABLE or a parenthesised select)."""
+    first = next(_sql_tokens(query), None)
+    return first is not None and (first[1] == "(" or first[1].lower() in ROW_RETURNING)
+
+
+def guard_query(query: str, max_rows: int = QUERY_MAX_ROWS) -> str:
+    """Return `query` with its top-level LIMIT injected or clamped to `max_rows`.
+
+    Only single statements are accepted. Statements that do not return rows
+    are passed through unchanged (the read-only transaction stops writes).
+    Raises ValueError with a message meant for the agent.
+    """
+    tokens = list(_sql_tokens(query))
+    statements = [[]]
+    for token in tokens:
+        if token[0] == "op" and token[1] == ";":
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    statements = [st for st in statements if st]
+    if not statements:
+        raise ValueError("Query rejected: empty query.")
+    if len(statements) > 1:
+        raise ValueError("Query rejected: run one statement at a time.")
+
+    tokens = statements[0]
+    text = query[tokens[0][2] : tokens[-1][3]]
+    if not returns_rows(text):
+        return text
+
+    offset = tokens[0][2]
+    top = [t[1].lower() for t in tokens if t[4] == 0 and t[0] == "word"]
+    limits = [i for i, t in enumerate(tokens) if t[4] == 0 and t[1].lower() == "limit"]
+    if limits and limits[-1] + 1 < len(tokens):
+        value = tokens[limits[-1] + 1]
+        # Only a bare count is clamped in place; LIMIT 1*1000000 is an expression.
+        after = tokens[limits[-1] + 2] if limits[-1] + 2 < len(tokens) else None
+        bare = after is None or (after[4] == 0 and after[1].lower() in ("offset", "for"))
+        if bare and (value[1].lower() == "all" or (value[0] == "number" and value[1].isdigit())):
+            if value[1].lower() == "all" or int(value[1]) > max_rows:
+                start, end = value[2] - offset, value[3] - offset
+                text = f"{text[:start]}{max_rows}{text[end:]}"
+            return text
+    elif "fetch" not in top:
+        return f"{text}\nLIMIT {max_rows}"
+    # LIMIT <expression> or FETCH FIRST ...: bound it from outside instead.
+    return f"SELECT * FROM (\n{text}\n) AS guarded LIMIT {max_rows}"
+
+
+def _begin_guarded(conn):
+    """Make the connection's current transaction read-only with a statement timeout."""
+    with conn.cursor() as c:
+        c.execute("SET TRANSACTION READ ONLY;")
+        c.execute("SET LOCAL statement_timeout = %s;", (STATEMENT_TIMEOUT_MS,))
+
+
+def _check_cost(conn, query):
+    """Raise ValueError if the planner's total cost estimate for `query` is above QUERY_MAX_COST."""
+    with conn.cursor() as c:
+        c.execute(f"EXPLAIN (FORMAT JSON) {query}")
+        plan = c.fetchone()[0][0]["Plan"]
+    cost = plan["Total Cost"]
+    if cost > QUERY_MAX_COST:
+        raise ValueError(
+            f"Query rejected: estimated cost {cost:,.0f} exceeds the limit of "
+            f"{QUERY_MAX_COST:,.0f} (about {plan.get('Plan Rows', 0):,} rows planned). "
+            "Filter metrics by sensor_name and a time range, use metric_aggregates "
+            "for per-lap or per-second aggregates, or sample fewer points."
+        )
+
+
+def _stream_query(conn, query):
+    """Run `query` on a named cursor; return (csv_text, rows_not_returned)."""
+    with conn.cursor(name=STREAM_CURSOR_NAME, cursor_factory=RealDictCursor) as stream:
+        stream.itersize = FETCH_BATCH_ROWS
+        stream.execute(query)
+        text, _, left = encode_csv(iter(lambda: stream.fetchmany(FETCH_BATCH_ROWS), []))
+        if left:
+            # Count the rest on the server instead of transferring it.
+            with conn.cursor() as c:
+                c.execute(f"MOVE FORWARD ALL IN {STREAM_CURSOR_NAME};")
+                left += c.rowcount
+    return text, left
+
+
+def normalize_query(query: str) -> str:
+    """Return the cache key for `query`: tokens joined by single spaces, words lower-cased.
+
+    Strings, quoted identifiers and numbers are kept verbatim, and trailing
+    semicolons are dropped.
+    """
+    tokens = [
+        text.lower() if kind == "word" else text for kind, text, *_ in _sql_tokens(query)
     ]
-)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
 
-sensor_names = get_metric_sensors(cur)
 
-# print("Inferred db schema: ", database_schema_string, "\nsensor names: ", sensor_names)
+def get_change_notifications(conn):
+    """Return (tables with the change-notification trigger, public views)."""
+    conn.execute(
+        "SELECT c.relname FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid"
+        " WHERE t.tgname = %s;",
+        (TABLE_TRIGGER_NAME,),
+    )
+    notifying = {row["relname"] for row in conn.fetchall()}
+    conn.execute(
+        "SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace"
+        " WHERE n.nspname = 'public' AND c.relkind IN ('v', 'm');"
+    )
+    return notifying, {row["relname"] for row in conn.fetchall()}
+
+
+def install_change_notifications(tables) -> set:
+    """Add the change-notification trigger to `tables`; return the tables that have it.
+
+    Needs DDL rights, so it runs from the setup step, not the query tool.
+    """
+    with get_cursor() as cur:
+        notifying, _ = get_change_notifications(cur)
+    missing = [t for t in tables if t not in notifying]
+    if missing:
+        with get_cursor() as cur:
+            cur.execute(TABLE_NOTIFY_FUNCTION)
+            for table in missing:
+                cur.execute(
+                    sql.SQL(
+                        "CREATE TRIGGER {} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE"
+                        " ON {} FOR EACH STATEMENT EXECUTE FUNCTION {}();"
+                    ).format(
+                        sql.Identifier(TABLE_TRIGGER_NAME),
+                        sql.Identifier(table),
+                        sql.Identifier(TABLE_TRIGGER_NAME),
+                    )
+                )
+        notifying.update(missing)
+    return notifying
+
+
+def _invalidate_results(table: str) -> None:
+    global _results_generation
+    with _results_lock:
+        _results_generation += 1
+        if table == "*":
+            _results.clear()
+        else:
+            for key in [k for k, (_, tables, *_) in _results.items() if table in tables]:
+                del _results[key]
+
+
+def _cache_tables(key: str):
+    """Return the tables `key` reads if its result may be cached, else None."""
+    global _notifying_tables
+    words = set(re.findall(r"[a-z_][\w$]*", key))
+    if words & VOLATILE_FUNCTIONS:
+        return None
+    if words & SYSTEM_SCHEMAS or any(w.startswith("pg_") for w in words):
+        return None
+    tables = tuple(t["table_name"] for t in describe_database()["tables"])
+    if (
+        _notifying_tables is None
+        or _notifying_tables[0] != tables
+        or time.monotonic() - _notifying_tables[3] > NOTIFY_RELOAD_S
+    ):
+        with get_cursor() as cur:
+            _notifying_tables = (tables, *get_change_notifications(cur), time.monotonic())
+    _, notifying, views, _ = _notifying_tables
+    read = words & set(tables)
+    # No known table (or a view) means nothing would ever invalidate the entry.
+    if not read or words & views or not read <= notifying | INGEST_TABLES.keys():
+        return None
+    return frozenset(read)
+
+
+def _watermarks(tables) -> tuple:
+    """Return max(<time column>) of each ingest table in `tables`, in name order."""
+    ingest = sorted(t for t in tables if t in INGEST_TABLES and t not in _notifying_tables[1])
+    if not ingest:
+        return ()
+    query = sql.SQL("SELECT {};").format(
+        sql.SQL(", ").join(
+            sql.SQL("(SELECT max({}) FROM {})").format(
+                sql.Identifier(INGEST_TABLES[t]), sql.Identifier(t)
+            )
+            for t in ingest
+        )
+    )
+    with get_connection() as conn:
+        _begin_guarded(conn)
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return tuple(cur.fetchone())
+
+
+def _execute_guarded(query: str) -> str:
+    """Guard, run and encode `query`; raises on rejection or database errors."""
+    query = guard_query(query)
+    with get_connection() as conn:
+        _begin_guarded(conn)
+        try:
+            if returns_rows(query):
+                _check_cost(conn, query)
+            text, left = _stream_query(conn, query)
+        except psycopg2.errors.SyntaxError:
+            # Not DECLARE-able (SHOW, EXPLAIN...): run it on a plain cursor.
+            conn.rollback()
+            _begin_guarded(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as local_cur:
+                local_cur.execute(query)
+                if local_cur.description is None:
+                    # No results to fetch (e.g., INSERT/UPDATE)
+                    return "Query executed successfully"
+                text, _, left = encode_csv(
+                    iter(lambda: local_cur.fetchmany(FETCH_BATCH_ROWS), [])
+                )
+    if left:
+        text += f"\n... {left} more rows truncated"
+    return text
+
+
+def run_sql_query(query: str) -> str:
+    # Pooled connection: committed on success, rolled back on error, then returned
+    try:
+        key = normalize_query(query)
+        cached = RESULT_CACHE_SIZE > 0 and returns_rows(key) and listen(
+            TABLE_CHANGED_CHANNEL, _invalidate_results
+        )
+        tables = None
+        if cached:
+            with _results_lock:
+                entry = _results.get(key)
+                generation = _results_generation
+            try:
+                if entry and entry[0] > time.monotonic():
+                    if not entry[3] or _watermarks(entry[1]) == entry[3]:
+                        with _results_lock:
+                            if key in _results:
+                                _results.move_to_end(key)
+                        return entry[2]
+                tables = _cache_tables(key)
+                # Taken before the query runs, so rows added meanwhile show up as a change.
+                marks = _watermarks(tables) if tables else ()
+            except Exception:
+                # Cache bookkeeping must never fail a valid query: run it uncached.
+                tables = None
+
+        text = _execute_guarded(query)
 
-@tool(description=f"""
+        if cached and tables is not None:
+            ttl = min(RESULT_CACHE_TTL_S, INGEST_CACHE_TTL_S) if marks else RESULT_CACHE_TTL_S
+            with _results_lock:
+                # Skip the fill if a write was announced while the query ran.
+                if generation == _results_generation:
+                    _results[key] = (time.monotonic() + ttl, tables, text, marks)
+                    _results.move_to_end(key)
+                    while len(_results) > RESULT_CACHE_SIZE:
+                        _results.popitem(last=False)
+        return text
+    except ValueError as e:
+        # Rejected by the query guard
+        return str(e)
+    except Exception as e:
+        return f"Failed to execute SQL query: {str(e)}"
+
+
+def sql_query_tool():
+    """Build the run_sql_query tool, describing the schema and sensors in its description.
+
+    Called by the agent builders rather than at import, so importing the
+    agents package never touches the database.
+    """
+    info = describe_database()
+    database_schema_string = "\n".join(
+        [
+            f"Table: {table['table_name']}\nColumns: {', '.join(table['column_names'])}"
+            for table in info["tables"]
+        ]
+    )
+    sensor_names = info["sensors"]
+    return tool(
+        "run_sql_query",
+        description=f"""
     Runs an SQL query in the Neon database.
     
     SCHEMA: {database_schema_string}
     
     metric.sensor_names: {sensor_names}
-    There is A LOT of metrics data, provide limits of 500 datapoints or aggregations. Only query specific sensors you will need.
+    There is A LOT of metrics data, provide limits of {QUERY_MAX_ROWS} datapoints or aggregations. Only query specific sensors you will need.
+    For per-lap or per-second min/max/avg/last of a sensor, use metric_aggregates instead;
+    to look at a long sensor trace, use downsample_sensor.
+    Queries run read-only with a {STATEMENT_TIMEOUT_MS // 1000} s timeout; results are capped at {QUERY_MAX_ROWS} rows and
+    queries the planner estimates as too expensive are rejected.
     Args:
         query: The SQL query to execute
     Returns:
         the result of the SQL query
-    """)
-def run_sql_query(query: str) -> str:
-    # Use a new cursor per call to avoid closing module-level cursor/connection
-    conn = None
-    try:
-        conn = psycopg2.connect(os.getenv("PG_CONNECTION_STRING"))
-        with conn.cursor(cursor_factory=RealDictCursor) as local_cur:
-            local_cur.execute(query)
-            try:
-                records = local_cur.fetchall()
-                conn.commit()
-                # Convert records to CSV
-                csv_result = records_to_csv(records)
-                return csv_result
-            except psycopg2.ProgrammingError:
-                # No results to fetch (e.g., INSERT/UPDATE)
-                conn.commit()
-                return "Query executed successfully"
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        return f"Failed to execute SQL query: {str(e)}"
-    finally:
-        if conn:
-            conn.close()
-        
-available_tools = [run_sql_query]
+    """,
+    )(run_sql_query)
+
+
+def encode_csv(batches, max_rows: int = RESULT_MAX_ROWS, max_chars: int = RESULT_MAX_CHARS):
+    """Encode batches of records (RealDict rows or tuples) as CSV within a budget.
+
+    Stops pulling batches as soon as the next row would exceed `max_rows` or
+    `max_chars`, so memory stays bounded by one batch. Returns
+    (csv_text, rows_written, rows_left_in_current_batch); the last is 0 only
+    if every record was written.
+    """
+    output = io.StringIO()
+    line = io.StringIO()
+    writer = None
+    written = 0
+
+    for batch in batches:
+        for i, r in enumerate(batch):
+            if writer is None:
+                # Determine headers from the first row
+                if isinstance(r, dict):
+                    headers = list(r.keys())
+                else:
+                    # assume sequence of sequences
+                    # create numeric headers like col0, col1, ...
+                    headers = [f"col{n}" for n in range(len(r))]
+                writer = csv.writer(line, lineterminator="\n")
+                writer.writerow(headers)
+                output.write(line.getvalue())
+
+            line.seek(0)
+            line.truncate()
+            writer.writerow([r.get(k) for k in headers] if isinstance(r, dict) else r)
+            if written >= max_rows or output.tell() + line.tell() > max_chars:
+                return output.getvalue().rstrip("\n"), written, len(batch) - i
+            output.write(line.getvalue())
+            written += 1
+
+    return output.getvalue().rstrip("\n"), written, 0
 
 
 def records_to_csv(records: list) -> str:
@@ -122,32 +643,19 @@ def records_to_csv(records: list) -> str:
     - list of dicts (RealDictCursor)
     - list of tuples/lists
     - empty list -> returns an empty string
-    """
-    import csv
-    import io
 
-    if not records:
-        return ""
+    Output is cut at the last whole row that fits in RESULT_MAX_CHARS.
+    """
+    return encode_csv([records], max_rows=len(records))[0]
 
-    output = io.StringIO()
 
-    # Determine headers and rows
-    first = records[0]
-    if isinstance(first, dict):
-        headers = list(first.keys())
-        writer = csv.DictWriter(output, fieldnames=headers)
-        writer.writeheader()
-        for r in records:
-            # r might already be a dict-like
-            writer.writerow({k: r.get(k) for k in headers})
-    else:
-        # assume sequence of sequences
-        # create numeric headers like col0, col1, ...
-        num_cols = len(first)
-        headers = [f"col{i}" for i in range(num_cols)]
-        writer = csv.writer(output)
-        writer.writerow(headers)
-        for r in records:
-            writer.writerow(r)
-
-    return output.getvalue()[:10000].rsplit('\n', 1)[0]
\ No newline at end of file
+if __name__ == "__main__":
+    # One-off setup with a role that owns the tables: create the strategy
+    # version history, install the sensor catalog and add the change
+    # notification triggers the result cache relies on.
+    with get_cursor() as cur:
+        install_schema(cur)
+        install_sensor_catalog(cur)
+    tables = [t["table_name"] for t in describe_database(refresh=True)["tables"]]
+    notifying = install_change_notifications([t for t in tables if t not in INGEST_TABLES])
+    print(f"Change notifications on: {', '.join(sorted(notifying)) or '(none)'}")
@@ -1,11 +1,16 @@
 import os
+import threading
 import traceback
+from collections import OrderedDict
 
 from langchain_core.tools import tool
 
 import fastf1
+import numpy as np
 import pandas as pd
 
+from tools.telemetry_store import STORE_CHANNELS, read_lap, read_lap_fields
+
 
 def ensure_fastf1_available():
     if fastf1 is None:
@@ -22,6 +27,256 @@ def _set_cache_dir():
     fastf1.Cache.enable_cache(cache_dir)
 
 
+# Loaded sessions are kept in-process, keyed by (year, event, session,
+# components), so repeated tool calls skip the seconds of pandas parsing
+# that the on-disk HTTP cache cannot save. A cached session also serves any
+# request for a subset of its components. Least recently used sessions are
+# evicted once their approximate footprint exceeds SESSION_CACHE_MB.
+SESSION_CACHE_MB = float(os.getenv("FASTF1_SESSION_CACHE_MB", "1024"))
+COMPONENTS = ("laps", "telemetry", "weather", "messages")
+
+# Channels served by each optional component; anything else is a lap column.
+TELEMETRY_CHANNELS = frozenset(
+    {
+        "SessionTime", "Time", "Date", "Speed", "RPM", "nGear", "Throttle", "Brake",
+        "DRS", "Source", "Status", "X", "Y", "Z", "Distance", "RelativeDistance",
+        "DriverAhead", "DistanceToDriverAhead",
+    }
+)
+WEATHER_CHANNELS = frozenset(
+    {"AirTemp", "Humidity", "Pressure", "Rainfall", "TrackTemp", "WindDirection", "WindSpeed"}
+)
+MESSAGE_CHANNELS = frozenset({"Deleted", "DeletedReason"})
+# fastf1_telemetry_batch refuses requests spanning more driver laps than this.
+MAX_BATCH_LAPS = 200
+
+# Laps are compared on a fixed distance grid from the start line. The grid
+# covers the longest circuit; each lap is NaN past its own length.
+DISTANCE_STEP_M = float(os.getenv("FASTF1_DISTANCE_STEP_M", "5"))
+MAX_LAP_DISTANCE_M = 7500.0
+DISTANCE_GRID = np.arange(0.0, MAX_LAP_DISTANCE_M, DISTANCE_STEP_M)
+RESAMPLE_CACHE_LAPS = int(os.getenv("FASTF1_RESAMPLE_CACHE_LAPS", "1024"))
+
+_resampled = OrderedDict()
+_resampled_lock = threading.Lock()
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+_load_locks = {}
+
+
+def parse_session_query(query: str):
+    """Split a query like "2023 Spanish GP Race" into (year, grand_prix, session_name).
+
+    Missing parts are returned as None.
+    """
+    parts = query.split()
+    year = None
+    gp = None
+    session_name = None
+    if parts and parts[0].isdigit():
+        year = int(parts[0])
+        # assume next tokens until 'GP' is the grand prix
+        if "GP" in parts:
+            gp_idx = parts.index("GP")
+            gp = " ".join(parts[1 : gp_idx + 1])
+            if len(parts) > gp_idx + 1:
+                session_name = parts[gp_idx + 1]
+        elif len(parts) >= 3:
+            gp = parts[1]
+            session_name = parts[2]
+    return year, gp, session_name
+
+
+def _session_nbytes(session) -> int:
+    """Approximate memory held by a loaded session's DataFrames."""
+    frames = []
+    for attr in ("laps", "weather_data", "race_control_messages", "results"):
+        try:
+            frames.append(getattr(session, attr))
+        except Exception:
+            # Component not loaded
+            pass
+    for attr in ("car_data", "pos_data"):
+        try:
+            frames.extend(getattr(session, attr).values())
+        except Exception:
+            pass
+    return int(
+        sum(f.memory_usage(index=True).sum() for f in frames if isinstance(f, pd.DataFrame))
+    )
+
+
+def _load_components(session, components):
+    """Load extra components into a session that already has laps loaded.
+
+    Mirrors the per-component steps of Session.load without re-parsing laps.
+    """
+    if not session.f1_api_support:
+        return
+    if "telemetry" in components:
+        session._load_telemetry()
+    if "weather" in components:
+        session._load_weather_data()
+    if "messages" in components:
+        session._load_race_control_messages()
+        session._set_laps_deleted_from_rcm()
+
+
+def channel_components(channels) -> frozenset:
+    """Return the session components needed to serve `channels`.
+
+    Laps are always needed to pick the driver's lap.
+    """
+    channels = set(channels)
+    needed = {"laps"}
+    if channels & TELEMETRY_CHANNELS:
+        needed.add("telemetry")
+    if channels & WEATHER_CHANNELS:
+        needed.add("weather")
+    if channels & MESSAGE_CHANNELS:
+        needed.add("messages")
+    return frozenset(needed)
+
+
+def load_session(year: int, event: str, session_name: str, components=("laps",)):
+    """Return a FastF1 session with at least `components` loaded, from the registry if possible.
+
+    `components` is any subset of COMPONENTS.
+    """
+    wanted = frozenset(components)
+    base = (year, event, session_name)
+    with _sessions_lock:
+        lock = _load_locks.setdefault(base, threading.Lock())
+
+    # One loader per session at a time; other callers wait and then hit.
+    with lock:
+        with _sessions_lock:
+            cached = [key for key in reversed(_sessions) if key[:3] == base]
+            for key in cached:
+                if wanted <= key[3]:
+                    _sessions.move_to_end(key)
+                    return _sessions[key][0]
+
+        # Upgrade a cached session with laps in place rather than reloading it.
+        upgradable = [key for key in cached if "laps" in key[3]]
+        if upgradable:
+            key = upgradable[0]
+            with _sessions_lock:
+                session, _ = _sessions.pop(key)
+            _load_components(session, wanted - key[3])
+            wanted |= key[3]
+        else:
+            session = fastf1.get_session(year, event, session_name)
+            session.load(**{c: c in wanted for c in COMPONENTS})
+        nbytes = _session_nbytes(session)
+
+        with _sessions_lock:
+            _sessions[base + (wanted,)] = (session, nbytes)
+            budget = SESSION_CACHE_MB * 1024 * 1024
+            while len(_sessions) > 1 and sum(n for _, n in _sessions.values()) > budget:
+                _sessions.popitem(last=False)
+        return session
+
+
+def parse_lap_ranges(spec: str) -> list:
+    """Expand a lap spec like "0-4,10,12-13" into a sorted list of lap indices."""
+    laps = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        laps.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(laps)
+
+
+def lap_telemetry(year: int, event: str, session_name: str, driver: str, lap_idx: int, channels):
+    """Return `channels` of one lap's telemetry, from the extracted store if possible.
+
+    Falls back to the registry session with laps and telemetry loaded.
+    """
+    channels = list(channels)
+    if set(channels) <= STORE_CHANNELS.keys():
+        stored = read_lap(year, event, session_name, driver, lap_idx, channels)
+        if stored is not None:
+            return stored
+    session = load_session(year, event, session_name, components=("laps", "telemetry"))
+    telemetry = session.laps.pick_driver(driver).iloc[lap_idx].get_telemetry().add_distance()
+    return telemetry[[c for c in channels if c in telemetry.columns]]
+
+
+def _interp_laps(traces: list, channels) -> dict:
+    """Project lap traces onto DISTANCE_GRID in one np.interp call per channel.
+
+    Laps are laid end to end by offsetting each one's distance, so a single
+    interpolation covers all of them; grid points outside a lap's own
+    distance range are set to NaN. Returns {channel: (laps x grid) array}.
+    """
+    span = DISTANCE_GRID[-1] + 2 * DISTANCE_STEP_M
+    dist, values, lo, hi = [], {c: [] for c in channels}, [], []
+    for i, trace in enumerate(traces):
+        d = trace["Distance"].to_numpy(dtype=float)
+        ok = np.isfinite(d)
+        d = d[ok]
+        lo.append(d.min() if len(d) > 1 else np.inf)
+        hi.append(d.max() if len(d) > 1 else -np.inf)
+        dist.append(d + i * span)
+        for c in channels:
+            column = trace[c]
+            if pd.api.types.is_timedelta64_dtype(column):
+                column = column.dt.total_seconds()
+            values[c].append(column.to_numpy(dtype=float)[ok])
+
+    dist = np.concatenate(dist)
+    x = (DISTANCE_GRID[None, :] + (np.arange(len(traces)) * span)[:, None]).ravel()
+    outside = (DISTANCE_GRID[None, :] < np.array(lo)[:, None]) | (
+        DISTANCE_GRID[None, :] > np.array(hi)[:, None]
+    )
+    out = {}
+    for c in channels:
+        if len(dist) < 2:
+            out[c] = np.full(outside.shape, np.nan, dtype=np.float32)
+            continue
+        matrix = np.interp(x, dist, np.concatenate(values[c])).reshape(outside.shape)
+        matrix[outside] = np.nan
+        out[c] = matrix.astype(np.float32)
+    return out
+
+
+def resample_laps(year: int, event: str, session_name: str, driver: str, lap_indices, channels) -> dict:
+    """Return {channel: (laps x DISTANCE_GRID) matrix} for a driver's laps.
+
+    Rows follow `lap_indices`; NaN marks grid points the lap did not cover.
+    Resampled rows are cached per (session, driver, lap), so comparing laps
+    is a matter of subtracting rows.
+    """
+    channels = list(dict.fromkeys(channels))
+    keys = [(year, event, session_name, driver, lap_idx) for lap_idx in lap_indices]
+    # Hold local references to the rows, so eviction (here or in another
+    # thread) never drops a lap this call still needs.
+    with _resampled_lock:
+        rows = {k: dict(_resampled.get(k, {})) for k in keys}
+    missing = [k for k in dict.fromkeys(keys) if not set(channels) <= rows[k].keys()]
+
+    if missing:
+        traces = [
+            lap_telemetry(year, event, session_name, driver, k[4], channels + ["Distance"])
+            for k in missing
+        ]
+        fresh = _interp_laps(traces, channels)
+        for i, k in enumerate(missing):
+            rows[k].update({c: fresh[c][i] for c in channels})
+
+    with _resampled_lock:
+        for k in keys:
+            _resampled.setdefault(k, {}).update(rows[k])
+            _resampled.move_to_end(k)
+        while len(_resampled) > RESAMPLE_CACHE_LAPS:
+            _resampled.popitem(last=False)
+
+    return {c: np.vstack([rows[k][c] for k in keys]) for c in channels}
+
+
 @tool
 def fastf1_session_summary(session_query: str = "2023 Spanish GP Race") -> str:
     """Return a short summary for a FastF1 session.
@@ -40,47 +295,28 @@ def fastf1_session_summary(session_query: str = "2023 Spanish GP Race") -> str:
     ensure_fastf1_available()
     _set_cache_dir()
 
-    # Parse session_query
-    parts = session_query.split()
-    year = None
-    session_name = None
-    gp = None
-    if parts and parts[0].isdigit():
-        year = int(parts[0])
-        # assume next tokens until 'GP' is the grand prix
-        if "GP" in parts:
-            gp_idx = parts.index("GP")
-            gp = " ".join(parts[1 : gp_idx + 1])
-            if len(parts) > gp_idx + 1:
-                session_name = parts[gp_idx + 1]
-        elif len(parts) >= 3:
-            gp = parts[1]
-            session_name = parts[2]
+    year, gp, session_name = parse_session_query(session_query)
 
     # Use fastf1 API to load session
     session, session_name = None, "Race"  # Hardcoded default
     if year and gp and session_name:
         # fastf1 expects event name without 'GP' sometimes; try both
         try:
-            session = fastf1.get_session(year, gp.replace(" GP", ""), session_name)
+            session = load_session(year, gp.replace(" GP", ""), session_name)
         except Exception:
             try:
-                session = fastf1.get_session(year, gp, session_name)
+                session = load_session(year, gp, session_name)
             except Exception as e:
                 return f"Failed to load session: {str(e)}"
     else:
         return "Could not parse session from query. Provide 'year grand_prix session' or 'year=YYYY;grand_prix=Name;session=FP1'."
 
-    session.load(laps=False, telemetry=False)
-
     # Build a short summary
     summary_lines = [f"Session: {session.event['EventName']} ({session.name})"]
     summary_lines.append(f"Date: {session.event['EventDate']}")
     summary_lines.append(f"Session type: {session.name}")
 
-    # Top lap times (laps not loaded, try to load minimal laps)
-    session.load(telemetry=False)
-
+    # Top lap times (laps were loaded by load_session)
     if not session.laps.empty:
         best = session.laps.nsmallest(5, "LapTime")["LapTime"].dt.total_seconds()
         summary_lines.append(
@@ -105,22 +341,17 @@ def fastf1_driver_laps(query: str = "2023 Spanish GP Race", driver: str = "VER")
     _set_cache_dir()
 
     # Parse session params like in session_summary function
-    parts = query.split()
-    year = int(parts[0]) if parts and parts[0].isdigit() else None
-    gp = None
-    session_name = None
-    if "GP" in parts:
-        gp_idx = parts.index("GP")
-        gp = " ".join(parts[1 : gp_idx + 1])
-        if len(parts) > gp_idx + 1:
-            session_name = parts[gp_idx + 1]
+    year, gp, session_name = parse_session_query(query)
+    if "GP" not in query.split():
+        gp = None
 
     if not (year and gp and session_name):
         return "Could not parse session from query."
 
     session_name = "Race"
-    session = fastf1.get_session(year, gp.replace(" GP", ""), session_name)
-    session.load(telemetry=False)
+    session = load_session(
+        year, gp.replace(" GP", ""), session_name, components=("laps", "weather", "messages")
+    )
     driver_laps = session.laps.pick_driver(driver)
     if driver_laps.empty:
         return f"No laps found for driver {driver} in session {query}"
@@ -200,21 +431,23 @@ def fastf1_telemetry(
 
     # Assume session is hardcoded here
     tokens = "2023 Spanish GP Race".split()
-    year = int(tokens[0]) if tokens and tokens[0].isdigit() else None
-    gp = None
-    session_name = None
-    if "GP" in tokens:
-        gp_idx = tokens.index("GP")
-        gp = " ".join(tokens[1 : gp_idx + 1])
-        if len(tokens) > gp_idx + 1:
-            session_name = tokens[gp_idx + 1]
+    year, gp, session_name = parse_session_query(" ".join(tokens))
 
     if not (year and gp and session_name):
         return "Could not parse session from query."
 
-    # load everything we might need
-    session = fastf1.get_session(year, gp.replace(" GP", ""), session_name)
-    session.load(laps=True, telemetry=True, weather=True, messages=True)
+    # Serve pure telemetry requests from the extracted store when present
+    event = gp.replace(" GP", "")
+    if channels and set(channels) <= STORE_CHANNELS.keys():
+        stored = read_lap(year, event, session_name, driver, lap_idx, channels)
+        # Time is also a lap column; the FastF1 path returns it in the lap Series.
+        fields = read_lap_fields(year, event, session_name, driver, lap_idx, channels)
+        if stored is not None and fields is not None:
+            return (stored, pd.DataFrame(), fields)
+
+    # load only what the requested channels need
+    components = channel_components(channels)
+    session = load_session(year, event, session_name, components=components)
 
     # pick driver laps
     laps = session.laps.pick_driver(driver)
@@ -222,16 +455,20 @@ def fastf1_telemetry(
         return f"No laps found for driver {driver} in session {tokens}"
 
     # Fetch telemetry for the specified lap and filter channels
-    telemetry_data = laps.iloc[lap_idx].get_telemetry().add_distance()
-    filtered_telemetry = telemetry_data[
-        [c for c in telemetry_data.columns if c in channels]
-    ]
+    filtered_telemetry = pd.DataFrame()
+    if "telemetry" in components:
+        telemetry_data = laps.iloc[lap_idx].get_telemetry().add_distance()
+        filtered_telemetry = telemetry_data[
+            [c for c in telemetry_data.columns if c in channels]
+        ]
 
     # Fetch weather data for the specified lap and filter channels
-    weather_data = laps.iloc[lap_idx].get_weather_data()
-    filtered_weather = weather_data[
-        [c for c in session.weather_data.columns if c in channels]  # type: ignore
-    ]
+    filtered_weather = pd.DataFrame()
+    if "weather" in components:
+        weather_data = laps.iloc[lap_idx].get_weather_data()
+        filtered_weather = weather_data[
+            [c for c in session.weather_data.columns if c in channels]  # type: ignore
+        ]
 
     # Fetch lap data and filter channels
     filtered_laps = laps.iloc[lap_idx][[c for c in laps.columns if c in channels]]
@@ -240,5 +477,112 @@ def fastf1_telemetry(
     return (filtered_telemetry, filtered_weather, filtered_laps)
 
 
+@tool
+def fastf1_telemetry_batch(
+    drivers: list[str] = ["VER"],
+    laps: str = "0-4",
+    channels: list[str] = ["Speed", "Throttle"],
+    mode: str = "summary",
+    points: int = 100,
+    query: str = "2023 Spanish GP Race",
+) -> str:
+    """Fetch telemetry for several laps of several drivers in one call.
+
+    Params:
+    * drivers: driver codes (e.g., ['VER', 'HAM'])
+    * laps: lap indices (0-based, as in fastf1_telemetry) as ranges, e.g. "0-4,10"
+    * channels: numeric telemetry channels (e.g., Speed, RPM, Throttle, Brake, nGear;
+                Time and SessionTime are reported in seconds)
+    * mode: "summary" for per-lap mean/min/max of each channel, or
+            "distance" for traces resampled onto a shared distance grid, with
+            each lap's time delta (s) to the first driver's first lap
+    * points: grid points per trace in distance mode (10..1000)
+    * query: session query in format '2023 Spanish GP Race'
+
+    Example: fastf1_telemetry_batch(['VER', 'HAM'], laps="10-15", channels=['Speed'], mode="distance")
+    """
+    ensure_fastf1_available()
+    _set_cache_dir()
+
+    if mode not in ("summary", "distance"):
+        return "TELEMETRY ERROR: mode must be 'summary' or 'distance'."
+    year, gp, session_name = parse_session_query(query)
+    if not (year and gp and session_name):
+        return "Could not parse session from query."
+    event = gp.replace(" GP", "")
+    try:
+        lap_list = parse_lap_ranges(laps)
+    except ValueError:
+        return f"TELEMETRY ERROR: could not parse lap ranges '{laps}'."
+    if len(drivers) * len(lap_list) > MAX_BATCH_LAPS:
+        return f"TELEMETRY ERROR: at most {MAX_BATCH_LAPS} driver laps per call."
+    unknown = [c for c in channels if c not in STORE_CHANNELS]
+    if unknown or not channels:
+        return (
+            f"TELEMETRY ERROR: unsupported channels {unknown}; use numeric telemetry channels "
+            f"({', '.join(STORE_CHANNELS)})."
+        )
+
+    if mode == "summary":
+        traces = {}
+        try:
+            for driver in drivers:
+                for lap_idx in lap_list:
+                    traces[(driver, lap_idx)] = lap_telemetry(
+                        year, event, session_name, driver, lap_idx, channels
+                    )
+        except IndexError:
+            return f"TELEMETRY ERROR: lap index out of range in '{laps}'."
+        except Exception as e:
+            return f"Failed to load telemetry: {str(e)}"
+        try:
+            frames = pd.concat(traces, names=["Driver", "Lap", None])[list(channels)]
+            # Times are summarised in seconds.
+            frames = frames.apply(
+                lambda col: col.dt.total_seconds()
+                if pd.api.types.is_timedelta64_dtype(col)
+                else pd.to_numeric(col, errors="coerce")
+            )
+            summary = frames.groupby(level=["Driver", "Lap"]).agg(["mean", "min", "max"])
+        except Exception as e:
+            return f"TELEMETRY ERROR: could not summarise channels {list(channels)}: {str(e)}"
+        summary.columns = [f"{c}_{stat}" for c, stat in summary.columns]
+        summary.insert(0, "Samples", frames.groupby(level=["Driver", "Lap"]).size())
+        return summary.round(3).to_csv()
+
+    # Distance is the grid column itself. Time within the lap on the shared
+    # grid gives the delta to the first lap.
+    channels = [c for c in dict.fromkeys(channels) if c != "Distance"]
+    resampled = {}
+    try:
+        for driver in drivers:
+            matrices = resample_laps(
+                year, event, session_name, driver, lap_list,
+                list(dict.fromkeys(channels + ["Time"])),
+            )
+            for c, matrix in matrices.items():
+                resampled.setdefault(c, []).append(matrix)
+    except IndexError:
+        return f"TELEMETRY ERROR: lap index out of range in '{laps}'."
+    except Exception as e:
+        return f"Failed to resample telemetry: {str(e)}"
+    resampled = {c: np.vstack(m) for c, m in resampled.items()}
+    labels = [f"{driver}:{lap_idx}" for driver in drivers for lap_idx in lap_list]
+
+    covered = np.flatnonzero(np.isfinite(resampled["Time"]).all(axis=0))
+    if not len(covered):
+        return "No telemetry samples for the requested laps."
+    points = max(10, min(int(points), 1000))
+    pick = np.unique(covered[np.linspace(0, len(covered) - 1, points).round().astype(int)])
+
+    delta = resampled["Time"] - resampled["Time"][:1]
+    columns = {"Distance": DISTANCE_GRID[pick]}
+    for i, label in enumerate(labels):
+        for c in channels:
+            columns[f"{label}:{c}"] = resampled[c][i, pick]
+        columns[f"{label}:Delta"] = delta[i, pick]
+    return pd.DataFrame(columns).round(3).to_csv(index=False)
+
+
 # Export the tools list for other modules to import
-available_tools = [fastf1_session_summary, fastf1_driver_laps, fastf1_telemetry]
+available_tools = [fastf1_session_summary, fastf1_driver_laps, fastf1_telemetry, fastf1_telemetry_batch]
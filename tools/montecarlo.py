@@ -0,0 +1,208 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.tools import tool
+
+from tools.sim import (
+    BASE_LAP_TIME_S,
+    lap_time_matrix,
+    pack_candidates,
+    pit_mask,
+    stint_index,
+    track_params,
+)
+from tools.strat import parse_strategy_yaml
+
+# Samples run in fixed-size chunks (so results do not depend on the worker
+# count), small enough that a default run has many more chunks than cores.
+CHUNK_SAMPLES = 256
+# Runs below this many sample x candidate x lap cells stay in-process:
+# shipping the work costs more than it saves. About twice the break-even
+# measured by benchmarks/montecarlo_parallel.py (~250k-300k cells for 2-8
+# workers), so the tool's default 20000-sample run goes to the pool.
+PARALLEL_MIN_CELLS = int(os.getenv("MC_PARALLEL_MIN_CELLS", "500000"))
+
+
+@dataclass(frozen=True)
+class ScenarioModel:
+    """Rates and time effects used when sampling race incidents and weather."""
+
+    # Expected number of full safety-car / VSC periods per race (Poisson).
+    safety_car_rate: float = 0.6
+    vsc_rate: float = 0.5
+    safety_car_laps: tuple = (3, 6)
+    vsc_laps: tuple = (1, 3)
+    # Extra lap time while neutralised, and the share of pit loss still paid.
+    safety_car_lap_delta_s: float = 0.4 * BASE_LAP_TIME_S
+    vsc_lap_delta_s: float = 0.3 * BASE_LAP_TIME_S
+    safety_car_pit_loss_share: float = 0.5
+    vsc_pit_loss_share: float = 0.6
+    # Rain starts somewhere in `rain_onset_laps` (inclusive) with this probability
+    # and lasts to the flag.
+    rain_probability: float = 0.0
+    rain_onset_laps: tuple = (1, 0)
+    # Per-lap penalty for each compound in COMPOUNDS order on a dry / wet track.
+    dry_track_penalty_s: tuple = (0.0, 0.0, 0.0, 6.0, 10.0)
+    wet_track_penalty_s: tuple = (12.0, 12.0, 12.0, 0.0, 2.0)
+
+
+def _neutralised_laps(rng, samples: int, laps: int, rate: float, length: tuple, cap: int = 3):
+    """Sample up to `cap` Poisson-distributed neutralisation periods per race as a lap mask."""
+    periods = np.minimum(rng.poisson(rate, samples), cap)
+    starts = rng.integers(1, laps + 1, size=(samples, cap))
+    ends = starts + rng.integers(length[0], length[1] + 1, size=(samples, cap)) - 1
+    active = np.arange(cap) < periods[:, None]
+    lap = np.arange(1, laps + 1)
+    inside = (lap >= starts[..., None]) & (lap <= ends[..., None]) & active[..., None]
+    return inside.any(axis=1)
+
+
+def sample_scenarios(rng, samples: int, laps: int, model: ScenarioModel) -> dict:
+    """Draw safety-car, VSC and rain-onset lap masks for `samples` races."""
+    safety_car = _neutralised_laps(rng, samples, laps, model.safety_car_rate, model.safety_car_laps)
+    vsc = _neutralised_laps(rng, samples, laps, model.vsc_rate, model.vsc_laps) & ~safety_car
+
+    first, last = model.rain_onset_laps
+    last = last or laps
+    raining = rng.random(samples) < model.rain_probability
+    onset = np.where(raining, rng.integers(first, last + 1, size=samples), laps + 1)
+    wet = np.arange(1, laps + 1) >= onset[:, None]
+    return {"safety_car": safety_car, "vsc": vsc, "wet": wet}
+
+
+def _race_times(payload: dict, scenarios: dict, model: ScenarioModel):
+    """Return a (sample x candidate) matrix of race times under sampled scenarios."""
+    neutral = (
+        scenarios["safety_car"] * model.safety_car_lap_delta_s
+        + scenarios["vsc"] * model.vsc_lap_delta_s
+    )
+    pit_saving = payload["pit_loss_s"] * (
+        scenarios["safety_car"] * (1.0 - model.safety_car_pit_loss_share)
+        + scenarios["vsc"] * (1.0 - model.vsc_pit_loss_share)
+    )
+    dry = np.asarray(model.dry_track_penalty_s)[payload["compound"]]
+    wet = np.asarray(model.wet_track_penalty_s)[payload["compound"]]
+
+    times = payload["base_total"] + dry.sum(axis=1) + neutral.sum(axis=1)[:, None]
+    times = times - pit_saving @ payload["pit"].T
+    times = times + scenarios["wet"].astype(float) @ (wet - dry).T
+    return times
+
+
+# One process pool for the life of the process; starting workers per call
+# cost more than the simulation itself.
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+        return _pool
+
+
+def _run_chunk(payload: dict, seed, samples: int, model: ScenarioModel):
+    rng = np.random.default_rng(seed)
+    scenarios = sample_scenarios(rng, samples, payload["laps"], model)
+    return _race_times(payload, scenarios, model)
+
+
+def _payload(data: dict, candidates: list) -> dict:
+    """Reduce candidates to the compact arrays each worker needs."""
+    params = track_params(data)
+    layout = pack_candidates(candidates)
+    idx = stint_index(layout, params["laps"])
+    return {
+        "laps": params["laps"],
+        "pit_loss_s": params["pit_loss_s"],
+        "base_total": lap_time_matrix(params, layout).sum(axis=1),
+        "compound": np.take_along_axis(layout["compound"], idx, axis=1).astype(np.int8),
+        "pit": pit_mask(layout, params["laps"]).astype(float),
+    }
+
+
+def run_monte_carlo(
+    data: dict,
+    candidates: list,
+    model: ScenarioModel = ScenarioModel(),
+    samples: int = 20000,
+    seed: int = 0,
+    workers: int = None,
+) -> dict:
+    """Re-simulate candidate stint lists under sampled safety cars, VSCs and rain.
+
+    Samples are split into fixed-size chunks, each with its own child of
+    `SeedSequence(seed)`, so results are identical for any worker count.
+    Small runs stay in-process; larger ones go to a shared process pool.
+    Returns mean, P10 and P90 race time per candidate.
+    """
+    payload = _payload(data, candidates)
+    sizes = [min(CHUNK_SAMPLES, samples - i) for i in range(0, samples, CHUNK_SAMPLES)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = workers or os.cpu_count() or 1
+    cells = samples * payload["pit"].size
+
+    if workers == 1 or len(sizes) == 1 or cells < PARALLEL_MIN_CELLS:
+        chunks = [_run_chunk(payload, s, n, model) for s, n in zip(seeds, sizes)]
+    else:
+        # Batches of chunks pickle the shared payload once each while still
+        # leaving several batches per worker for load balancing.
+        n = len(sizes)
+        chunks = list(
+            _get_pool(workers).map(
+                _run_chunk, [payload] * n, seeds, sizes, [model] * n,
+                chunksize=max(1, n // (workers * 4)),
+            )
+        )
+
+    times = np.concatenate(chunks, axis=0)
+    p10, p90 = np.percentile(times, [10, 90], axis=0)
+    return {
+        "mean_s": times.mean(axis=0),
+        "p10_s": p10,
+        "p90_s": p90,
+        "samples": samples,
+    }
+
+
+## -------- Tools ----------
+
+
+@tool("simulate_event_scenarios", return_direct=False)
+def simulate_event_scenarios(
+    yaml_texts: list[str], rain_probability: float = 0.0, rain_onset_laps: list[int] = []
+) -> str:
+    """Compare strategy YAMLs under random safety cars, VSCs and an optional rain onset.
+
+    Args:
+        yaml_texts: strategy YAMLs to compare; the first one supplies the track model.
+        rain_probability: chance (0..1) that rain arrives during the race.
+        rain_onset_laps: optional [first, last] lap range in which rain may start.
+
+    Returns mean, P10 and P90 projected race time per strategy.
+    """
+    try:
+        docs = [parse_strategy_yaml(text) for text in yaml_texts]
+        onset = tuple(rain_onset_laps) if len(rain_onset_laps) == 2 else (1, 0)
+        model = ScenarioModel(rain_probability=rain_probability, rain_onset_laps=onset)
+        result = run_monte_carlo(docs[0], [d.get("stints", []) for d in docs], model)
+    except Exception as e:
+        return f"SIMULATION ERROR: {e}"
+
+    lines = [f"{result['samples']} sampled races per strategy."]
+    for i, doc in enumerate(docs):
+        name = (doc.get("metadata", {}) or {}).get("strategy_name", f"strategy {i + 1}")
+        plan = " → ".join(s.get("compound", "?") for s in doc.get("stints", []))
+        lines.append(
+            f"{name} ({plan}): mean {result['mean_s'][i]:.3f} s, "
+            f"P10 {result['p10_s'][i]:.3f} s, P90 {result['p90_s'][i]:.3f} s"
+        )
+    return "\n".join(lines)
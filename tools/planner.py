@@ -0,0 +1,280 @@
+import copy
+
+import numpy as np
+import yaml
+from langchain_core.tools import tool
+
+from tools.montecarlo import ScenarioModel
+from tools.sim import COMPOUNDS, DRY_COMPOUNDS, USED_SET_AGE_LAPS, simulate_strategy, track_params
+from tools.strat import parse_strategy_yaml
+
+WET_COMPOUNDS = ("Intermediate", "Wet")
+# domain_validate_strategy warns on dry stints longer than this share of the race.
+MAX_DRY_STINT_SHARE = 0.7
+
+
+def _tyre_sets(assumptions: dict, wet: bool = False) -> list:
+    """Return the (compound, set_condition, count) sets the constraints allow us to fit.
+
+    Intermediates and wets are only fitted when the track is expected to be wet.
+    """
+    constraints = assumptions.get("constraints", {}) or {}
+    inventory = assumptions.get("tire_availability", {}) or {}
+    avoid = set(constraints.get("avoid_compounds", []) or [])
+    allow_used = bool(constraints.get("allow_used_tyre", False))
+
+    sets = []
+    for key, count in inventory.items():
+        compound, _, condition = key.partition("_")
+        if compound not in COMPOUNDS or compound in avoid or int(count or 0) <= 0:
+            continue
+        if compound in WET_COMPOUNDS and not wet:
+            continue
+        if condition == "used" and not allow_used:
+            continue
+        sets.append((compound, condition, int(count)))
+    return sets
+
+
+def _stint_costs(params: dict, sets: list, laps: int):
+    """Return a (set x length) table of strategy-dependent stint time, inf where disallowed.
+
+    Fuel and base pace are identical for every plan, so a stint costs its
+    warm-up lap plus accumulated degradation, independent of where it starts.
+    """
+    lengths = np.arange(laps + 1)
+    max_dry = int(MAX_DRY_STINT_SHARE * laps)
+    costs = np.full((len(sets), laps + 1), np.inf)
+    for k, (compound, condition, _) in enumerate(sets):
+        c = COMPOUNDS.index(compound)
+        offset = USED_SET_AGE_LAPS if condition == "used" else 0
+        row = params["warmup"][c] + params["degradation"][c] * (
+            offset * lengths + lengths * (lengths - 1) / 2
+        )
+        row[0] = np.inf
+        if compound in DRY_COMPOUNDS:
+            row[max_dry + 1 :] = np.inf
+        costs[k] = row
+    return costs
+
+
+def weather_penalties(laps: int, wet_from_lap: int = 0, model: ScenarioModel = ScenarioModel()):
+    """Return a (compound x lap + 1) table of cumulative weather penalty after each lap.
+
+    The track is dry before `wet_from_lap` and wet from it to the flag
+    (0 = dry all race), priced like `ScenarioModel` prices a rain onset.
+    """
+    lap = np.arange(1, laps + 1)
+    wet = (wet_from_lap > 0) & (lap >= wet_from_lap)
+    per_lap = np.where(
+        wet,
+        np.asarray(model.wet_track_penalty_s)[:, None],
+        np.asarray(model.dry_track_penalty_s)[:, None],
+    )
+    return np.concatenate([np.zeros((len(COMPOUNDS), 1)), per_lap.cumsum(axis=1)], axis=1)
+
+
+def _used_vectors(counts: list, limit: int):
+    """Yield every tuple u with 0 <= u[k] <= counts[k] and sum(u) <= limit."""
+    if not counts:
+        yield ()
+        return
+    for first in range(min(counts[0], limit) + 1):
+        for rest in _used_vectors(counts[1:], limit - first):
+            yield (first,) + rest
+
+
+def plan_optimal_stints(
+    data: dict, wet_from_lap: int = 0, model: ScenarioModel = ScenarioModel()
+) -> dict:
+    """Return the time-optimal stint plan for a strategy's track, constraints and tyres.
+
+    Solves a backward dynamic program over (lap, sets used of each kind),
+    which fixes the compounds used, stops made and remaining inventory. Each state is the best cost to the flag from the
+    start of a stint at that lap; transitions pick the tyre set and in-lap of
+    the next stint. The terminal rules mirror `domain_validate_strategy`, so
+    the result passes it unchanged. Stints also pay `weather_penalties`, so
+    wet-weather sets are only fitted from `wet_from_lap` (0 = dry race).
+    """
+    params = track_params(data)
+    laps = params["laps"]
+    if not 0 <= wet_from_lap <= laps:
+        raise ValueError(f"wet_from_lap must be between 0 and {laps}, got {wet_from_lap}.")
+    assumptions = data.get("assumptions", {}) or {}
+    constraints = assumptions.get("constraints", {}) or {}
+    min_compounds = int(constraints.get("min_compounds_required", 0))
+
+    sets = _tyre_sets(assumptions, wet=wet_from_lap > 0)
+    if not sets:
+        raise ValueError("No tyre sets available under the current constraints.")
+    total_sets = sum(count for _, _, count in sets)
+    max_stops = min(int(constraints.get("max_pitstops", 99)), laps - 1, total_sets - 1)
+    # No plan fits more than max_stops + 1 sets, so larger counts only grow the state space.
+    sets = [(compound, condition, min(count, max_stops + 1)) for compound, condition, count in sets]
+
+    # A stint-start state is the number of sets used so far of each kind:
+    # stops made is their sum and the compounds used follow from it, so only
+    # used-count vectors with at most max_stops sets are enumerated.
+    counts = [count for _, _, count in sets]
+    used = list(_used_vectors(counts, max_stops))
+    index = {u: i for i, u in enumerate(used)}
+    used = np.array(used, dtype=np.int64).reshape(len(used), len(sets))
+    n_states = len(used)
+    state = np.arange(n_states)
+    stops = used.sum(axis=1)
+    bits = np.array([1 << COMPOUNDS.index(c) for c, _, _ in sets])
+    mask = np.bitwise_or.reduce(np.where(used > 0, bits, 0), axis=1)
+    remaining = np.array(counts) - used
+
+    n_masks = 1 << len(COMPOUNDS)
+    dry_bits = sum(1 << COMPOUNDS.index(c) for c in DRY_COMPOUNDS)
+    wet_bits = sum(1 << COMPOUNDS.index(c) for c in WET_COMPOUNDS)
+
+    def finish_ok(m, stints):
+        dry_used = np.array([bin(x).count("1") for x in range(n_masks)])[m & dry_bits]
+        only_wet = (m & ~wet_bits) == 0
+        return ((stints >= 2) | only_wet) & ((dry_used == 0) | (dry_used >= min_compounds))
+
+    stint_costs = _stint_costs(params, sets, laps)
+    penalties = weather_penalties(laps, wet_from_lap, model)[[COMPOUNDS.index(c) for c, _, _ in sets]]
+    moves = []
+    for k in range(len(sets)):
+        has_set = remaining[:, k] > 0
+        new_mask = mask | bits[k]
+        can_pit = has_set & (stops < max_stops)
+        step = np.eye(len(sets), dtype=np.int64)[k]
+        moves.append(
+            {
+                "pit_next": np.array(
+                    [index[tuple(u + step)] if ok else 0 for u, ok in zip(used, can_pit)],
+                    dtype=np.int64,
+                ),
+                "pit_ok": can_pit,
+                "finish": np.where(has_set & finish_ok(new_mask, stops + 1), 0.0, np.inf),
+            }
+        )
+
+    value = np.full((laps + 2, n_states), np.inf)
+    choice = np.zeros((laps + 2, n_states, 2), dtype=np.int64)
+    for start in range(laps, 0, -1):
+        remaining_laps = laps - start + 1
+        best = np.full(n_states, np.inf)
+        for k, move in enumerate(moves):
+            # Run to the flag on set k.
+            paid = penalties[k, start - 1]
+            cost = stint_costs[k, remaining_laps] + penalties[k, laps] - paid + move["finish"]
+            better = cost < best
+            best[better] = cost[better]
+            choice[start, better] = (k, 0)
+
+            if remaining_laps < 2:
+                continue
+            # Box at the end of lap `inlap`, for every inlap in start..laps-1 at once.
+            inlaps = np.arange(start, laps)
+            future = value[inlaps + 1][:, move["pit_next"]]
+            cost = (
+                (stint_costs[k, inlaps - start + 1] + penalties[k, inlaps] - paid)[:, None]
+                + params["pit_loss_s"]
+                + future
+            )
+            cost[:, ~move["pit_ok"]] = np.inf
+            pick = cost.argmin(axis=0)
+            cost = cost[pick, state]
+            better = cost < best
+            best[better] = cost[better]
+            choice[start, better, 0] = k
+            choice[start, better, 1] = inlaps[pick[better]]
+        value[start] = best
+
+    current = index[(0,) * len(sets)]
+    if not np.isfinite(value[1, current]):
+        raise ValueError("No stint plan satisfies the strategy constraints.")
+
+    stints = []
+    start = 1
+    while True:
+        k, inlap = (int(x) for x in choice[start, current])
+        compound, condition, _ = sets[k]
+        stints.append((start, inlap, compound, condition))
+        if inlap == 0:
+            break
+        current = int(moves[k]["pit_next"][current])
+        start = inlap + 1
+    return _build_plan(stints, laps)
+
+
+def _build_plan(stints: list, laps: int) -> dict:
+    """Render (start, inlap, compound, condition) tuples as schema-shaped stints and user_view."""
+    rendered = []
+    for stint_id, (start, inlap, compound, condition) in enumerate(stints, start=1):
+        length = (inlap or laps) - start + 1
+        stint = {
+            "stint_id": stint_id,
+            "start_lap": start,
+            "planned_inlap": inlap,
+            "compound": compound,
+            "set_condition": condition,
+            "target_len_laps": length,
+        }
+        if inlap:
+            stint["expected_age_at_box_laps"] = length - 1
+        else:
+            stint["expected_age_at_flag_laps"] = length
+        stint.update(
+            {
+                "target_pace_adjust_s": 0.0,
+                "push_profile": "normal",
+                "pit_window_laps": [max(inlap - 2, start), min(inlap + 2, laps - 1)] if inlap else [],
+            }
+        )
+        rendered.append(stint)
+
+    pit_laps = [s["planned_inlap"] for s in rendered if s["planned_inlap"] > 0]
+    stops = len(pit_laps)
+    summary = f"{stops}-stop: Start " + " → ".join(s["compound"][0] for s in rendered)
+    return {
+        "stints": rendered,
+        "user_view": {"plan_summary": summary, "planned_pit_laps": pit_laps},
+    }
+
+
+def apply_optimal_plan(data: dict, wet_from_lap: int = 0) -> dict:
+    """Return a copy of `data` with its stints and user_view replaced by the optimal plan."""
+    planned = copy.deepcopy(data)
+    plan = plan_optimal_stints(data, wet_from_lap)
+    planned["stints"] = plan["stints"]
+    planned["user_view"] = plan["user_view"]
+    return planned
+
+
+## -------- Tools ----------
+
+
+@tool("plan_optimal_strategy", return_direct=False)
+def plan_optimal_strategy(yaml_text: str, wet_from_lap: int = 0) -> str:
+    """Replace the stints and user_view of a strategy YAML with the time-optimal pit plan.
+
+    Honours max_pitstops, min_compounds_required, avoid_compounds, allow_used_tyre
+    and tire_availability. Returns the complete updated YAML.
+
+    Args:
+        yaml_text: the strategy YAML to plan.
+        wet_from_lap: lap from which the track is expected to be wet; 0 for a dry race.
+            Intermediates and wets are only used on a wet track.
+    """
+    try:
+        data = parse_strategy_yaml(yaml_text)
+        planned = apply_optimal_plan(data, wet_from_lap)
+        projected = simulate_strategy(planned)["total_time_s"]
+        # simulate_strategy has no weather model; add what the plan was priced with.
+        laps = track_params(data)["laps"]
+        penalties = weather_penalties(laps, wet_from_lap)
+        for stint in planned["stints"]:
+            c = COMPOUNDS.index(stint["compound"])
+            end = stint["planned_inlap"] or laps
+            projected += penalties[c, end] - penalties[c, stint["start_lap"] - 1]
+    except Exception as e:
+        return f"PLANNING ERROR: {e}"
+    return f"# Projected race time: {projected:.3f} s\n" + yaml.safe_dump(
+        planned, sort_keys=False, allow_unicode=True
+    )
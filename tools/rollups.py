@@ -0,0 +1,328 @@
+import re
+
+import psycopg2
+import psycopg2.errors
+from langchain_core.tools import tool
+from psycopg2.extras import RealDictCursor
+
+from db import get_connection, get_cursor
+from tools.db import QUERY_MAX_ROWS, _begin_guarded, encode_csv
+
+# Shape of the raw metrics table the rollups are built from.
+METRICS_TABLE = "metrics"
+TIME_COLUMN = "time"
+VALUE_COLUMN = "value"
+# The sensor whose value is the current lap number. Per-lap rollups assume
+# metrics holds one car's session, so lap numbers are unique.
+LAP_SENSOR = "lap"
+
+# Rows newer than now() - ROLLUP_GRACE are left for the next refresh, so
+# samples committed slightly out of order are still counted; rows that
+# arrive later than that with times behind the watermark are not. Each
+# refresh transaction covers at most ROLLUP_BATCH of metrics time.
+ROLLUP_GRACE = "5 seconds"
+ROLLUP_BATCH = "1 hour"
+ROLLUP_LOCK_KEY = "metrics_rollup"
+
+ROLLUP_DDL = f"""
+CREATE TABLE IF NOT EXISTS metrics_rollup_1s (
+    sensor_name TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    n BIGINT NOT NULL,
+    min DOUBLE PRECISION,
+    max DOUBLE PRECISION,
+    sum DOUBLE PRECISION,
+    first_time TIMESTAMPTZ NOT NULL,
+    last_time TIMESTAMPTZ NOT NULL,
+    last_value DOUBLE PRECISION,
+    PRIMARY KEY (sensor_name, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_lap (
+    sensor_name TEXT NOT NULL,
+    lap INTEGER NOT NULL,
+    n BIGINT NOT NULL,
+    min DOUBLE PRECISION,
+    max DOUBLE PRECISION,
+    sum DOUBLE PRECISION,
+    first_time TIMESTAMPTZ NOT NULL,
+    last_time TIMESTAMPTZ NOT NULL,
+    last_value DOUBLE PRECISION,
+    PRIMARY KEY (sensor_name, lap)
+);
+
+CREATE TABLE IF NOT EXISTS metrics_lap_starts (
+    lap INTEGER PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_state (
+    name TEXT PRIMARY KEY,
+    watermark TIMESTAMPTZ NOT NULL
+);
+"""
+
+# Built concurrently so ingest into metrics is never blocked; this cannot
+# run inside a transaction.
+ROLLUP_INDEX_DDL = f"""
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {METRICS_TABLE}_{TIME_COLUMN}_idx
+    ON {METRICS_TABLE} ({TIME_COLUMN});
+"""
+
+# Merges a batch into an existing rollup row; `r` is the stored row.
+_MERGE = """
+    n = r.n + EXCLUDED.n,
+    min = least(r.min, EXCLUDED.min),
+    max = greatest(r.max, EXCLUDED.max),
+    sum = r.sum + EXCLUDED.sum,
+    first_time = least(r.first_time, EXCLUDED.first_time),
+    last_time = greatest(r.last_time, EXCLUDED.last_time),
+    last_value = CASE WHEN EXCLUDED.last_time >= r.last_time
+                      THEN EXCLUDED.last_value ELSE r.last_value END
+"""
+
+_AGGREGATES = f"""
+    count(*), min({VALUE_COLUMN}), max({VALUE_COLUMN}), sum({VALUE_COLUMN}),
+    min({TIME_COLUMN}), max({TIME_COLUMN}),
+    (array_agg({VALUE_COLUMN} ORDER BY {TIME_COLUMN} DESC))[1]
+"""
+
+_REFRESH_SQL = [
+    f"""
+    INSERT INTO metrics_lap_starts (lap, started_at)
+    SELECT {VALUE_COLUMN}::int, min({TIME_COLUMN}) FROM {METRICS_TABLE}
+    WHERE sensor_name = %(lap_sensor)s AND {TIME_COLUMN} > %(lo)s AND {TIME_COLUMN} <= %(hi)s
+    GROUP BY 1
+    ON CONFLICT (lap) DO UPDATE
+    SET started_at = least(metrics_lap_starts.started_at, EXCLUDED.started_at);
+    """,
+    f"""
+    INSERT INTO metrics_rollup_1s AS r
+    SELECT sensor_name, date_trunc('second', {TIME_COLUMN}), {_AGGREGATES}
+    FROM {METRICS_TABLE}
+    WHERE {TIME_COLUMN} > %(lo)s AND {TIME_COLUMN} <= %(hi)s
+    GROUP BY 1, 2
+    ON CONFLICT (sensor_name, bucket) DO UPDATE SET {_MERGE};
+    """,
+    f"""
+    WITH spans AS (
+        SELECT lap, started_at, lead(started_at) OVER (ORDER BY started_at) AS ended_at
+        FROM metrics_lap_starts
+    )
+    INSERT INTO metrics_rollup_lap AS r
+    SELECT m.sensor_name, s.lap, {_AGGREGATES}
+    FROM {METRICS_TABLE} m
+    JOIN spans s ON m.{TIME_COLUMN} >= s.started_at
+                AND (s.ended_at IS NULL OR m.{TIME_COLUMN} < s.ended_at)
+    WHERE m.{TIME_COLUMN} > %(lo)s AND m.{TIME_COLUMN} <= %(hi)s
+    GROUP BY 1, 2
+    ON CONFLICT (sensor_name, lap) DO UPDATE SET {_MERGE};
+    """,
+]
+
+
+def install_rollups():
+    """Create the rollup tables and the metrics time index if they are missing.
+
+    Needs DDL rights on metrics, so it runs from the setup job
+    (python -m tools.rollups), never from the tool.
+    """
+    with get_cursor() as cur:
+        cur.execute(ROLLUP_DDL)
+    with get_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(ROLLUP_INDEX_DDL)
+        finally:
+            conn.autocommit = False
+
+
+def _refresh_batch(conn) -> bool:
+    """Roll up the next batch past the watermark; return False once caught up or locked."""
+    # One snapshot for every statement, so the watermark matches what was rolled up.
+    conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+    conn.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked;", (ROLLUP_LOCK_KEY,))
+    if not conn.fetchone()["locked"]:
+        return False
+    conn.execute(
+        f"""
+        WITH w AS (
+            SELECT coalesce(
+                (SELECT watermark FROM metrics_rollup_state WHERE name = %s), '-infinity'
+            ) AS lo
+        ), next_row AS (
+            SELECT lo, (SELECT min({TIME_COLUMN}) FROM {METRICS_TABLE} WHERE {TIME_COLUMN} > lo) AS first
+            FROM w
+        )
+        -- Start each batch at the next stored row, so gaps in metrics cost nothing.
+        SELECT lo, first,
+               least(first + interval '{ROLLUP_BATCH}', now() - interval '{ROLLUP_GRACE}') AS hi
+        FROM next_row;
+        """,
+        (METRICS_TABLE,),
+    )
+    window = conn.fetchone()
+    if window["first"] is None or window["hi"] < window["first"]:
+        return False
+
+    params = {"lo": window["lo"], "hi": window["hi"], "lap_sensor": LAP_SENSOR}
+    for statement in _REFRESH_SQL:
+        conn.execute(statement, params)
+    # Advance to the newest row rolled up, not to `hi`, so rows loaded later
+    # with times inside this window are still picked up next time.
+    conn.execute(
+        f"""
+        INSERT INTO metrics_rollup_state (name, watermark)
+        SELECT %(name)s, max({TIME_COLUMN}) FROM {METRICS_TABLE}
+        WHERE {TIME_COLUMN} > %(lo)s AND {TIME_COLUMN} <= %(hi)s
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark;
+        """,
+        dict(params, name=METRICS_TABLE),
+    )
+    return True
+
+
+def refresh_rollups() -> int:
+    """Bring the rollups up to date with metrics; return the number of batches applied.
+
+    Only rows past the stored watermark are read, one ROLLUP_BATCH per
+    transaction, so a refresh costs as much as the new data. Concurrent
+    callers skip rather than wait while another refresh holds the lock.
+    """
+    batches = 0
+    while True:
+        with get_cursor() as cur:
+            if not _refresh_batch(cur):
+                break
+        batches += 1
+    return batches
+
+
+def _staleness(conn) -> str:
+    """Return a note on how far the rollups lag metrics, or "" when they are current."""
+    conn.execute(
+        f"""
+        SELECT (SELECT watermark FROM metrics_rollup_state WHERE name = %s) AS watermark,
+               (SELECT max({TIME_COLUMN}) FROM {METRICS_TABLE}) AS newest;
+        """,
+        (METRICS_TABLE,),
+    )
+    row = conn.fetchone()
+    if row["newest"] is None or (row["watermark"] and row["watermark"] >= row["newest"]):
+        return ""
+    if row["watermark"] is None:
+        return f"; rollups not built yet (metrics up to {row['newest']})"
+    return f"; rollups up to {row['watermark']}, metrics up to {row['newest']}"
+
+
+_BUCKET = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)\s*$")
+_BUCKET_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def plan_aggregate_query(sensor_names, bucket="lap", start=None, end=None, laps=None):
+    """Return (sql, params, source) answering the request from the smallest table that can.
+
+    Per-lap requests read metrics_rollup_lap, whole-second buckets re-bucket
+    metrics_rollup_1s, and only sub-second buckets touch raw metrics.
+    """
+    params = {"sensors": list(sensor_names), "start": start, "end": end, "limit": QUERY_MAX_ROWS}
+    stats = """n, min, max, sum / nullif(n, 0) AS avg, last_value AS last"""
+
+    if bucket == "lap":
+        first, last = (list(laps or []) + [None, None])[:2]
+        params.update(first=first, last=last)
+        sql = f"""
+            SELECT sensor_name, lap, {stats}
+            FROM metrics_rollup_lap
+            WHERE sensor_name = ANY(%(sensors)s)
+              AND (%(first)s::int IS NULL OR lap >= %(first)s)
+              AND (%(last)s::int IS NULL OR lap <= %(last)s)
+              AND (%(start)s::timestamptz IS NULL OR last_time >= %(start)s)
+              AND (%(end)s::timestamptz IS NULL OR first_time <= %(end)s)
+            ORDER BY lap, sensor_name
+            LIMIT %(limit)s;
+        """
+        return sql, params, "metrics_rollup_lap"
+
+    match = _BUCKET.match(bucket or "")
+    if not match:
+        raise ValueError(f"Unsupported bucket '{bucket}'; use 'lap' or e.g. '500ms', '1s', '10s', '5m'.")
+    seconds = float(match.group(1)) * _BUCKET_SECONDS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError("Bucket size must be positive.")
+    params["seconds"] = seconds
+
+    if seconds >= 1 and seconds.is_integer():
+        source, time_col = "metrics_rollup_1s", "bucket"
+        aggregates = """sum(n) AS n, min(min) AS min, max(max) AS max,
+                   sum(sum) / nullif(sum(n), 0) AS avg,
+                   (array_agg(last_value ORDER BY last_time DESC))[1] AS last"""
+    else:
+        source, time_col = METRICS_TABLE, TIME_COLUMN
+        aggregates = f"""count(*) AS n, min({VALUE_COLUMN}) AS min, max({VALUE_COLUMN}) AS max,
+                   avg({VALUE_COLUMN}) AS avg,
+                   (array_agg({VALUE_COLUMN} ORDER BY {TIME_COLUMN} DESC))[1] AS last"""
+    sql = f"""
+        SELECT sensor_name,
+               to_timestamp(floor(extract(epoch FROM {time_col}) / %(seconds)s) * %(seconds)s) AS bucket,
+               {aggregates}
+        FROM {source}
+        WHERE sensor_name = ANY(%(sensors)s)
+          AND (%(start)s::timestamptz IS NULL OR {time_col} >= %(start)s)
+          AND (%(end)s::timestamptz IS NULL OR {time_col} <= %(end)s)
+        GROUP BY 1, 2
+        ORDER BY 2, 1
+        LIMIT %(limit)s;
+    """
+    return sql, params, source
+
+
+## -------- Tools ----------
+
+
+@tool("metric_aggregates", return_direct=False)
+def metric_aggregates(
+    sensor_names: list[str], bucket: str = "lap", start: str = "", end: str = "", laps: list[int] = []
+) -> str:
+    """Per-lap or per-time-bucket n/min/max/avg/last of metrics sensors, from pre-aggregated rollups.
+
+    Prefer this over run_sql_query for aggregates: it reads rollup tables
+    instead of raw metrics rows. Rollups are refreshed by a scheduled job, so
+    the header notes when they lag the newest metrics row.
+
+    Args:
+        sensor_names: metrics.sensor_name values to aggregate.
+        bucket: "lap", or a time bucket such as "1s", "10s", "5m" or "500ms".
+        start: optional ISO timestamp; only data at or after it.
+        end: optional ISO timestamp; only data at or before it.
+        laps: optional [first, last] lap range (bucket="lap" only).
+    Returns:
+        CSV with one row per sensor and bucket, preceded by the table it came from.
+    """
+    try:
+        sql, params, source = plan_aggregate_query(
+            sensor_names, bucket, start or None, end or None, laps or None
+        )
+        with get_connection() as conn:
+            _begin_guarded(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                try:
+                    cur.execute(sql, params)
+                except psycopg2.errors.UndefinedTable:
+                    return "AGGREGATE ERROR: rollups are not installed; run `python -m tools.rollups` first."
+                text, _, _ = encode_csv([cur.fetchall()])
+                # Read-only: the scheduled job refreshes, so report how far it got.
+                note = _staleness(cur) if source != METRICS_TABLE else ""
+        return f"# source: {source}{note}\n{text}"
+    except ValueError as e:
+        return f"AGGREGATE ERROR: {e}"
+    except Exception as e:
+        return f"Failed to aggregate metrics: {str(e)}"
+
+
+if __name__ == "__main__":
+    # Run once to install and backfill, then from cron to keep the rollups
+    # warm between tool calls.
+    install_rollups()
+    print(f"Applied {refresh_rollups()} rollup batch(es).")
@@ -0,0 +1,479 @@
+import functools
+import itertools
+import json
+
+import numpy as np
+from langchain_core.tools import tool
+
+from context import RaceState
+from tools.strat import parse_strategy_yaml
+
+COMPOUNDS = ("Soft", "Medium", "Hard", "Intermediate", "Wet")
+DRY_COMPOUNDS = ("Soft", "Medium", "Hard")
+
+# The schema has no absolute pace or fuel sensitivity, so race times are
+# projected against a nominal clean-air lap and a typical fuel effect.
+BASE_LAP_TIME_S = 95.0
+FUEL_EFFECT_S_PER_KG = 0.03
+# Used sets are assumed to have been scrubbed for a few laps in earlier sessions.
+USED_SET_AGE_LAPS = 3
+# sweep_pit_strategies scores variations in chunks of about this many
+# candidates and refuses sweeps larger than SWEEP_MAX_CANDIDATES.
+SWEEP_CHUNK_CANDIDATES = 16384
+SWEEP_MAX_CANDIDATES = 2_000_000
+
+
+def track_params(data: dict) -> dict:
+    """Pull the per-track and per-race constants the simulator needs into arrays."""
+    track = data["metadata"]["track"]
+    fuel = data.get("assumptions", {}).get("fuel", {}) or {}
+    pit_ops = data.get("pit_ops", {}) or {}
+    deg = track["degradation_model"]
+    warmup = track["warmup_loss_first_lap_s"]
+    return {
+        "laps": int(track["laps"]),
+        "degradation": np.array([float(deg[c]) for c in COMPOUNDS]),
+        "warmup": np.array([float(warmup[c]) for c in COMPOUNDS]),
+        "pit_loss_s": float(track["pit_lane_time_loss_s"])
+        + float(pit_ops.get("nominal_box_time_s", 0.0)),
+        "fuel_start_kg": float(fuel.get("start_mass_kg", 0.0)),
+        "fuel_burn_kg": float(fuel.get("burn_rate_kg_per_lap", 0.0)),
+    }
+
+
+def stint_arrays(stints: list) -> dict:
+    """Return start laps, in-laps, compounds, tyre age offsets and pace offsets for a stint list."""
+    ordered = sorted(stints, key=lambda s: int(s.get("start_lap", 1) or 1))
+    return {
+        "start": np.array([int(s.get("start_lap", 1) or 1) for s in ordered]),
+        "inlap": np.array([int(s.get("planned_inlap", 0) or 0) for s in ordered]),
+        "compound": np.array([COMPOUNDS.index(s["compound"]) for s in ordered]),
+        "age_offset": np.array(
+            [USED_SET_AGE_LAPS if s.get("set_condition") == "used" else 0 for s in ordered]
+        ),
+        "pace": np.array([float(s.get("target_pace_adjust_s", 0.0) or 0.0) for s in ordered]),
+    }
+
+
+def pack_candidates(candidates: list) -> dict:
+    """Pack N stint lists into (N, max_stints) arrays.
+
+    Missing trailing stints are padded with a start lap that never begins and
+    no in-lap, so they contribute nothing to the simulation.
+    """
+    layouts = [stint_arrays(stints) for stints in candidates]
+    width = max(len(l["start"]) for l in layouts)
+    padded = {
+        "start": np.full((len(layouts), width), np.iinfo(np.int32).max, dtype=np.int64),
+        "inlap": np.zeros((len(layouts), width), dtype=np.int64),
+        "compound": np.zeros((len(layouts), width), dtype=np.int64),
+        "age_offset": np.zeros((len(layouts), width), dtype=np.int64),
+        "pace": np.zeros((len(layouts), width)),
+    }
+    for row, layout in enumerate(layouts):
+        for key, values in layout.items():
+            padded[key][row, : len(values)] = values
+    return padded
+
+
+def stint_index(layout: dict, total: int, first_lap: int = 1):
+    """Return a (candidate x lap) matrix of the stint each lap from `first_lap` is run on."""
+    n, width = layout["start"].shape
+    count = total - first_lap + 1
+    # Mark every stint start, then a running count gives each lap's stint index.
+    # Stints that began before `first_lap` all land on the first column.
+    rows = np.repeat(np.arange(n), width)
+    marks = np.zeros((n, count + 1), dtype=np.int64)
+    np.add.at(marks, (rows, np.clip(layout["start"].ravel() - first_lap, 0, count)), 1)
+    return np.clip(np.cumsum(marks[:, :count], axis=1) - 1, 0, None)
+
+
+def pit_mask(layout: dict, total: int, first_lap: int = 1):
+    """Return a boolean (candidate x lap) matrix, from `first_lap`, set on every in-lap."""
+    n, width = layout["inlap"].shape
+    rows = np.repeat(np.arange(n), width)
+    inlap = layout["inlap"].ravel()
+    boxed = (inlap >= first_lap) & (inlap <= total)
+    mask = np.zeros((n, total - first_lap + 1), dtype=bool)
+    mask[rows[boxed], inlap[boxed] - first_lap] = True
+    return mask
+
+
+def lap_time_matrix(
+    params: dict, layout: dict, base_lap_time_s: float = BASE_LAP_TIME_S, first_lap: int = 1
+):
+    """Return a (candidate x lap) matrix of projected lap times for packed layouts.
+
+    Only laps `first_lap..laps` are evaluated; column 0 is `first_lap`.
+    """
+    total = params["laps"]
+    laps = np.arange(first_lap, total + 1)
+    idx = stint_index(layout, total, first_lap)
+
+    laps_in = laps - np.take_along_axis(layout["start"], idx, axis=1)
+    age = laps_in + np.take_along_axis(layout["age_offset"], idx, axis=1)
+    compound = np.take_along_axis(layout["compound"], idx, axis=1)
+    fuel = np.maximum(params["fuel_start_kg"] - params["fuel_burn_kg"] * (laps - 1), 0.0)
+    times = (
+        base_lap_time_s
+        + FUEL_EFFECT_S_PER_KG * fuel
+        + params["degradation"][compound] * age
+        + params["warmup"][compound] * (laps_in == 0)
+        + np.take_along_axis(layout["pace"], idx, axis=1)
+        + params["pit_loss_s"] * pit_mask(layout, total, first_lap)
+    )
+    return times
+
+
+def score_terms(data: dict, params: dict, layout: dict, times) -> dict:
+    """Return the per-candidate terms weighted by the `costs` block.
+
+    All terms are "lower is better":
+    * total_time: projected race time (s)
+    * track_position: time lost merging into traffic after each stop (s)
+    * tire_life_buffer: degradation carried at the end of each stint (s/lap)
+    * compound_preference: laps run on `avoid_compounds`
+    * risk: unsafe-release exposure, one unit per stop
+    """
+    total = params["laps"]
+    constraints = data.get("assumptions", {}).get("constraints", {}) or {}
+    pit_ops = data.get("pit_ops", {}) or {}
+
+    starts = layout["start"]
+    active = starts <= total
+    ends = np.where(layout["inlap"] > 0, layout["inlap"], total)
+    lengths = np.where(active, ends - starts + 1, 0)
+    stops = np.count_nonzero((layout["inlap"] > 0) & active, axis=1)
+
+    avoid = [COMPOUNDS.index(c) for c in constraints.get("avoid_compounds", []) or []]
+    avoided = np.isin(layout["compound"], avoid) & active
+
+    return {
+        "total_time": times.sum(axis=1),
+        "track_position": stops * float(pit_ops.get("traffic_merge_penalty_s", 0.0)),
+        "tire_life_buffer": (
+            params["degradation"][layout["compound"]]
+            * np.where(active, np.maximum(lengths - 1, 0) + layout["age_offset"], 0)
+        ).sum(axis=1),
+        "compound_preference": (lengths * avoided).sum(axis=1).astype(float),
+        "risk": stops * float(pit_ops.get("unsafe_release_risk_weight", 0.0)),
+    }
+
+
+def weighted_score(data: dict, terms: dict):
+    """Combine score terms with the strategy's `costs` weights."""
+    costs = data.get("costs", {}) or {}
+    return sum(float(costs.get(f"weight_{name}", 0.0)) * value for name, value in terms.items())
+
+
+def evaluate_layouts(data: dict, layout: dict, base_lap_time_s: float = BASE_LAP_TIME_S) -> dict:
+    """Simulate and score already-packed (candidate x stint) layouts in one pass."""
+    params = track_params(data)
+    times = lap_time_matrix(params, layout, base_lap_time_s)
+    terms = score_terms(data, params, layout, times)
+    return {
+        "lap_times_s": times,
+        "total_time_s": terms["total_time"],
+        "score": weighted_score(data, terms),
+        "pit_stops": np.count_nonzero(
+            (layout["inlap"] > 0) & (layout["start"] <= params["laps"]), axis=1
+        ),
+    }
+
+
+def evaluate_candidates(data: dict, candidates: list, base_lap_time_s: float = BASE_LAP_TIME_S) -> dict:
+    """Evaluate N candidate stint lists that share `data`'s track, assumptions and costs."""
+    return evaluate_layouts(data, pack_candidates(candidates), base_lap_time_s)
+
+
+def simulate_strategy(data: dict, base_lap_time_s: float = BASE_LAP_TIME_S) -> dict:
+    """Project lap-by-lap and total race time for a parsed strategy document."""
+    result = evaluate_candidates(data, [data.get("stints", []) or []], base_lap_time_s)
+    return {
+        "lap_times_s": result["lap_times_s"][0],
+        "total_time_s": float(result["total_time_s"][0]),
+        "score": float(result["score"][0]),
+        "pit_stops": int(result["pit_stops"][0]),
+    }
+
+
+@functools.lru_cache(maxsize=64)
+def _cumulative_lap_times(key: str, base_lap_time_s: float):
+    data = json.loads(key)
+    return np.cumsum(simulate_strategy(data, base_lap_time_s)["lap_times_s"])
+
+
+def _prefix_time(data: dict, lap: int, base_lap_time_s: float) -> float:
+    """Return the projected time to complete laps 1..lap-1 as planned, cached per plan."""
+    if lap <= 1:
+        return 0.0
+    key = json.dumps(
+        {
+            "metadata": {"track": data["metadata"]["track"]},
+            "assumptions": {"fuel": data.get("assumptions", {}).get("fuel", {})},
+            "pit_ops": data.get("pit_ops", {}),
+            "stints": data.get("stints", []),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return float(_cumulative_lap_times(key, base_lap_time_s)[lap - 2])
+
+
+def evaluate_from_state(
+    data: dict, candidates: list, state: RaceState, base_lap_time_s: float = BASE_LAP_TIME_S
+) -> dict:
+    """Evaluate candidate stint lists over laps `state.current_lap..laps` only.
+
+    The stint each candidate has running at the current lap is replaced by the
+    car's actual compound and tyre age, fuel is taken from the snapshot, and
+    stops before the current lap are ignored. Time already raced is
+    `state.elapsed_s` when known, otherwise the cached projection of the
+    document's own plan up to the current lap.
+    """
+    params = dict(track_params(data))
+    current = int(state.current_lap)
+    if not 1 <= current <= params["laps"]:
+        raise ValueError(f"current_lap must be between 1 and {params['laps']}, got {current}.")
+    if state.compound not in COMPOUNDS:
+        raise ValueError(f"Unknown compound {state.compound!r}; expected one of {', '.join(COMPOUNDS)}.")
+    params["fuel_start_kg"] = float(state.fuel_mass_kg) + params["fuel_burn_kg"] * (current - 1)
+
+    layout = {key: values.copy() for key, values in pack_candidates(candidates).items()}
+    running = np.clip((layout["start"] <= current).sum(axis=1) - 1, 0, None)
+    rows = np.arange(len(running))
+    # Starting the running stint `tyre_age` laps ago yields the right age and
+    # only charges the warm-up lap when the set is fresh this lap.
+    layout["start"][rows, running] = current - int(state.tyre_age_laps)
+    layout["compound"][rows, running] = COMPOUNDS.index(state.compound)
+    layout["age_offset"][rows, running] = 0
+
+    times = lap_time_matrix(params, layout, base_lap_time_s, first_lap=current)
+    if state.elapsed_s is not None:
+        elapsed = float(state.elapsed_s)
+    else:
+        elapsed = _prefix_time(data, current, base_lap_time_s)
+    remaining = times.sum(axis=1)
+    return {
+        "lap_times_s": times,
+        "remaining_time_s": remaining,
+        "total_time_s": elapsed + remaining,
+    }
+
+
+def simulate_from_state(
+    data: dict, state: RaceState, base_lap_time_s: float = BASE_LAP_TIME_S
+) -> dict:
+    """Re-project a strategy document from a mid-race snapshot."""
+    result = evaluate_from_state(data, [data.get("stints", []) or []], state, base_lap_time_s)
+    return {
+        "lap_times_s": result["lap_times_s"][0],
+        "remaining_time_s": float(result["remaining_time_s"][0]),
+        "total_time_s": float(result["total_time_s"][0]),
+    }
+
+
+def sweep_layouts(data: dict, max_shift: int = 3, chunk_size: int = SWEEP_CHUNK_CANDIDATES):
+    """Yield every pit-lap/compound variation of a strategy as packed layouts, in chunks.
+
+    Each planned stop moves within its stint's `pit_window_laps` (or +/- `max_shift`
+    laps when no window is set) and each stint may run any non-avoided compound.
+    Layouts with out-of-order stops or that break the compound/inventory rules
+    enforced by `domain_validate_strategy` are dropped; with allow_used_tyre,
+    a compound's used sets count towards its inventory and are fitted once
+    its new sets run out. Each chunk holds at
+    most about `chunk_size` candidates; raises ValueError when the sweep
+    would exceed SWEEP_MAX_CANDIDATES.
+    """
+    total = int(data["metadata"]["track"]["laps"])
+    assumptions = data.get("assumptions", {}) or {}
+    constraints = assumptions.get("constraints", {}) or {}
+    inventory = assumptions.get("tire_availability", {}) or {}
+    stints = sorted(data.get("stints", []) or [], key=lambda s: int(s.get("start_lap", 1)))
+
+    pit_ranges = []
+    for s in stints[:-1]:
+        inlap = int(s.get("planned_inlap", 0) or 0)
+        window = s.get("pit_window_laps") or [inlap - max_shift, inlap + max_shift]
+        pit_ranges.append(range(max(window[0], 1), min(window[1], total - 1) + 1))
+
+    avoid = set(constraints.get("avoid_compounds", []) or [])
+    allowed = [COMPOUNDS.index(c) for c in COMPOUNDS if c not in avoid]
+
+    # Compound rules do not depend on the pit laps, so filter compounds once.
+    comps = np.array(list(itertools.product(allowed, repeat=len(stints))), dtype=np.int64)
+    comps = comps.reshape(-1, len(stints))
+    used = np.stack([np.any(comps == COMPOUNDS.index(c), axis=1) for c in DRY_COMPOUNDS], axis=1)
+    dry_count = used.sum(axis=1)
+    min_compounds = int(constraints.get("min_compounds_required", 0))
+    keep = (dry_count == 0) | (dry_count >= min_compounds)
+    allow_used = bool(constraints.get("allow_used_tyre", False))
+    new_sets = np.array([int(inventory.get(f"{c}_new", 0)) for c in COMPOUNDS])
+    used_sets = np.array([int(inventory.get(f"{c}_used", 0)) if allow_used else 0 for c in COMPOUNDS])
+    for i in range(len(COMPOUNDS)):
+        keep &= np.count_nonzero(comps == i, axis=1) <= new_sets[i] + used_sets[i]
+    comps = comps[keep]
+    if not len(comps):
+        return
+    # Once a compound's new sets are used up, its later stints run on used sets.
+    earlier = np.tril(np.ones((len(stints), len(stints)), dtype=bool), k=-1)
+    seen = ((comps[:, :, None] == comps[:, None, :]) & earlier).sum(axis=2)
+    comp_ages = np.where(seen >= new_sets[comps], USED_SET_AGE_LAPS, 0)
+
+    n_pits = int(np.prod([len(r) for r in pit_ranges]))
+    if n_pits * len(comps) > SWEEP_MAX_CANDIDATES:
+        raise ValueError(
+            f"{n_pits * len(comps)} variations exceed the sweep limit of {SWEEP_MAX_CANDIDATES}; "
+            "narrow the pit windows, avoid compounds or reduce the number of stints."
+        )
+
+    pace = [float(s.get("target_pace_adjust_s", 0.0) or 0.0) for s in stints]
+    pit_iter = itertools.product(*pit_ranges)
+    per_chunk = max(1, chunk_size // len(comps))
+    while True:
+        pits = np.array(list(itertools.islice(pit_iter, per_chunk)), dtype=np.int64)
+        if not len(pits):
+            return
+        pits = pits.reshape(-1, len(pit_ranges))
+        pits = pits[np.all(np.diff(pits, axis=1) > 0, axis=1)]
+        if not len(pits):
+            continue
+        pit_idx, comp_idx = np.meshgrid(np.arange(len(pits)), np.arange(len(comps)), indexing="ij")
+        chunk_pits, chunk_comps = pits[pit_idx.ravel()], comps[comp_idx.ravel()]
+        n = len(chunk_pits)
+        yield {
+            "start": np.concatenate([np.ones((n, 1), dtype=np.int64), chunk_pits + 1], axis=1),
+            "inlap": np.concatenate([chunk_pits, np.zeros((n, 1), dtype=np.int64)], axis=1),
+            "compound": chunk_comps,
+            "age_offset": comp_ages[comp_idx.ravel()],
+            "pace": np.tile(pace, (n, 1)),
+        }
+
+
+def best_variations(data: dict, top_k: int = 5, max_shift: int = 3):
+    """Return (evaluated count, best `top_k` variations by score) of a strategy's sweep.
+
+    Chunks are scored one at a time and only a running top-k is kept, so
+    memory stays bounded by the chunk size. Each variation is a dict with
+    compound indices, used-set flags, pit laps, total time and score.
+    """
+    evaluated = 0
+    best = []
+    for layout in sweep_layouts(data, max_shift):
+        result = evaluate_layouts(data, layout)
+        evaluated += len(result["score"])
+        for i in np.argsort(result["score"], kind="stable")[:top_k]:
+            best.append(
+                {
+                    "compound": [int(c) for c in layout["compound"][i]],
+                    "used": [bool(a) for a in layout["age_offset"][i]],
+                    "pits": [int(p) for p in layout["inlap"][i] if p > 0],
+                    "total_time_s": float(result["total_time_s"][i]),
+                    "score": float(result["score"][i]),
+                }
+            )
+        best = sorted(best, key=lambda v: v["score"])[:top_k]
+    return evaluated, best
+
+
+## -------- Tools ----------
+
+
+@tool("simulate_strategy_yaml", return_direct=False)
+def simulate_strategy_yaml(yaml_text: str) -> str:
+    """Project the total race time of a strategy YAML. Returns total time, stops and per-stint times."""
+    try:
+        data = parse_strategy_yaml(yaml_text)
+        result = simulate_strategy(data)
+    except Exception as e:
+        return f"SIMULATION ERROR: {e}"
+
+    times = result["lap_times_s"]
+    lines = [
+        f"Projected race time: {result['total_time_s']:.3f} s",
+        f"Weighted score: {result['score']:.3f}",
+        f"Pit stops: {result['pit_stops']}",
+    ]
+    laps = len(times)
+    for s in sorted(data.get("stints", []), key=lambda s: int(s.get("start_lap", 1))):
+        start = int(s.get("start_lap", 1))
+        end = int(s.get("planned_inlap", 0) or 0) or laps
+        lines.append(
+            f"Stint {s.get('stint_id')} ({s.get('compound')}, laps {start}-{end}): "
+            f"{times[start - 1 : end].sum():.3f} s"
+        )
+    return "\n".join(lines)
+
+
+@tool("simulate_strategy_from_lap", return_direct=False)
+def simulate_strategy_from_lap(
+    yaml_text: str,
+    current_lap: int,
+    compound: str,
+    tyre_age_laps: int,
+    fuel_mass_kg: float,
+    elapsed_s: float = None,
+) -> str:
+    """Re-project a strategy YAML from the car's current state mid-race.
+
+    Args:
+        yaml_text: the strategy YAML whose remaining stints to project.
+        current_lap: lap the car is on now (1..laps).
+        compound: compound currently fitted.
+        tyre_age_laps: laps already done on the current set.
+        fuel_mass_kg: fuel on board now.
+        elapsed_s: race time so far; estimated from the plan when omitted.
+
+    Returns the remaining and projected total race time and per-stint times from `current_lap`.
+    """
+    try:
+        data = parse_strategy_yaml(yaml_text)
+        state = RaceState(current_lap, compound, tyre_age_laps, fuel_mass_kg, elapsed_s)
+        result = simulate_from_state(data, state)
+    except Exception as e:
+        return f"SIMULATION ERROR: {e}"
+
+    times = result["lap_times_s"]
+    laps = current_lap + len(times) - 1
+    lines = [
+        f"Remaining time (laps {current_lap}-{laps}): {result['remaining_time_s']:.3f} s",
+        f"Projected race time: {result['total_time_s']:.3f} s",
+    ]
+    for s in sorted(data.get("stints", []), key=lambda s: int(s.get("start_lap", 1))):
+        start = max(int(s.get("start_lap", 1)), current_lap)
+        end = int(s.get("planned_inlap", 0) or 0) or laps
+        if end < current_lap:
+            continue
+        # The running stint is on the car's actual compound.
+        fitted = compound if start == current_lap else s.get("compound")
+        lines.append(
+            f"Stint {s.get('stint_id')} ({fitted}, laps {start}-{end}): "
+            f"{times[start - current_lap : end - current_lap + 1].sum():.3f} s"
+        )
+    return "\n".join(lines)
+
+
+@tool("sweep_pit_strategies", return_direct=False)
+def sweep_pit_strategies(yaml_text: str, top_k: int = 5) -> str:
+    """Score every pit-lap/compound variation of a strategy YAML within its pit windows.
+
+    Returns the `top_k` variations by weighted `costs` score, best first.
+    """
+    try:
+        data = parse_strategy_yaml(yaml_text)
+        evaluated, best = best_variations(data, top_k)
+        if not evaluated:
+            return "No variations satisfy the strategy constraints."
+    except Exception as e:
+        return f"SIMULATION ERROR: {e}"
+
+    lines = [f"Evaluated {evaluated} variations."]
+    for rank, v in enumerate(best, start=1):
+        plan = " → ".join(
+            COMPOUNDS[c] + (" (used)" if used else "") for c, used in zip(v["compound"], v["used"])
+        )
+        lines.append(
+            f"{rank}. {plan} | pit laps {v['pits']} | "
+            f"time {v['total_time_s']:.3f} s | score {v['score']:.3f}"
+        )
+    return "\n".join(lines)
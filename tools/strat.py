@@ -1,6 +1,10 @@
 import yaml
 import json
 import difflib
+import threading
+from collections import OrderedDict
+
+import xxhash
 from jsonschema import Draft202012Validator, ValidationError
 from pathlib import Path
 from langchain_core.tools import tool
@@ -8,6 +12,7 @@ from langchain_core.tools import tool
 from db import load_strategy, save_strategy
 
 SCHEMA_PATH = Path("strategy.schema.json")
+PARSE_CACHE_SIZE = 128
 
 
 def _load_yaml_text(p):
@@ -18,21 +23,96 @@ def _load_schema_obj(p):
     return json.loads(p.read_text(encoding="utf-8"))
 
 
-def _validate_yaml_against_schema(yaml_text, schema_obj):
-    """Return None if valid, else a multi-line error string."""
+_schema_lock = threading.Lock()
+_schema_cache = {"key": None, "schema": None, "schema_json": None, "validator": None}
+
+
+def _compiled_schema():
+    """Return the cached schema entry, rebuilding it only when the schema file changes.
+
+    The entry holds the schema object, its compact JSON text and a compiled
+    Draft202012Validator shared by every tool in the process. Returns None when
+    the schema file does not exist.
+    """
+    try:
+        stat = SCHEMA_PATH.stat()
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    entry = _schema_cache
+    if entry["key"] == key:
+        return entry
+    with _schema_lock:
+        if _schema_cache["key"] != key:
+            schema = _load_schema_obj(SCHEMA_PATH)
+            Draft202012Validator.check_schema(schema)
+            _schema_cache.update(
+                key=key,
+                schema=schema,
+                schema_json=json.dumps(schema),
+                validator=Draft202012Validator(schema),
+            )
+        return _schema_cache
+
+
+def get_schema_validator():
+    """Return the process-wide compiled strategy schema validator, or None if the schema is missing."""
+    entry = _compiled_schema()
+    return entry["validator"] if entry else None
+
+
+_parse_lock = threading.Lock()
+_parse_cache = OrderedDict()
+
+
+def parse_strategy_yaml(yaml_text: str):
+    """Parse strategy YAML once per distinct text, via a bounded LRU keyed by xxh3.
+
+    The returned document is shared between callers and must not be mutated;
+    copy it first if it needs editing. Parse errors propagate and are not cached.
+    """
+    key = xxhash.xxh3_128_intdigest(yaml_text.encode("utf-8"))
+    with _parse_lock:
+        if key in _parse_cache:
+            _parse_cache.move_to_end(key)
+            return _parse_cache[key]
+
+    parsed = yaml.safe_load(yaml_text)
+    with _parse_lock:
+        _parse_cache[key] = parsed
+        if len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return parsed
+
+
+def _validate_yaml_against_schema(yaml_text, schema_obj=None):
+    """Return None if valid, else a multi-line error string.
+
+    Uses the shared compiled validator unless an explicit schema object is given.
+    """
     try:
-        data = yaml.safe_load(yaml_text)
+        data = parse_strategy_yaml(yaml_text)
     except Exception as e:
         return f"YAML parse error: {e}"
 
+    if schema_obj is None:
+        validator = get_schema_validator()
+        if validator is None:
+            return "ERROR: strategy.schema.json not found."
+    else:
+        validator = Draft202012Validator(schema_obj)
+
     try:
-        Draft202012Validator(schema_obj).validate(data)
+        validator.validate(data)
         return None
     except ValidationError as e:
-        path = "$" + "".join(
-            f"[{repr(p)}]" if isinstance(p, int) else f".{p}" for p in e.path
-        )
-        return f"Schema validation error at {path}:\n{e.message}"
+        return f"Schema validation error at {_json_path(e)}:\n{e.message}"
+
+
+def _json_path(error):
+    return "$" + "".join(
+        f"[{repr(p)}]" if isinstance(p, int) else f".{p}" for p in error.path
+    )
 
 
 def _unified_diff(a, b):
@@ -59,18 +139,16 @@ def read_strategy_yaml(strategy: str = "default_strategy") -> str:
 @tool("read_strategy_schema", return_direct=False)
 def read_strategy_schema() -> str:
     """Return the JSON schema (as compact JSON string) used to validate strategy YAML."""
-    if not SCHEMA_PATH.exists():
+    entry = _compiled_schema()
+    if entry is None:
         return "ERROR: strategy.schema.json not found."
-    return json.dumps(_load_schema_obj(SCHEMA_PATH))
+    return entry["schema_json"]
 
 
 @tool("validate_strategy_yaml", return_direct=False)
 def validate_strategy_yaml(yaml_text: str) -> str:
     """Validate provided YAML text against the loaded JSON schema. Returns 'OK' or an error report."""
-    if not SCHEMA_PATH.exists():
-        return "ERROR: strategy.schema.json not found."
-    schema = _load_schema_obj(SCHEMA_PATH)
-    err = _validate_yaml_against_schema(yaml_text, schema)
+    err = _validate_yaml_against_schema(yaml_text)
     return "OK" if err is None else err
 
 
@@ -78,7 +156,7 @@ def validate_strategy_yaml(yaml_text: str) -> str:
 def save_updated_strategy(yaml_text: str) -> str:
     """Save the provided strategy YAML text to the database as a new strategy."""
     try:
-        data = yaml.safe_load(yaml_text)
+        data = parse_strategy_yaml(yaml_text)
         strategy_name = data.get("metadata", {}).get(
             "strategy_name", "default_strategy"
         )
@@ -98,60 +176,42 @@ def diff_strategies(new_yaml_text: str) -> str:
     return _unified_diff(old_text, new_yaml_text)
 
 
-@tool("check_yaml_completeness", return_direct=False)
-def check_yaml_completeness(yaml_text: str) -> str:
-    """Check if YAML has all required top-level sections."""
-    try:
-        data = yaml.safe_load(yaml_text)
-        required = [
-            "version",
-            "metadata",
-            "assumptions",
-            "user_view",
-            "stints",
-            "pit_ops",
-            "costs",
-        ]
-        missing = [s for s in required if s not in data]
-        if missing:
-            return f"INCOMPLETE: Missing sections: {', '.join(missing)}"
-
-        # Also check if stints is properly populated
-        if "stints" in data and (not data["stints"] or len(data["stints"]) == 0):
-            return "INCOMPLETE: stints section is empty"
-
-        return "COMPLETE"
-    except Exception as e:
-        return f"PARSE ERROR: {e}"
-
-
-@tool("domain_validate_strategy", return_direct=False)
-def domain_validate_strategy(yaml_text: str) -> str:
-    """
-    Domain-level validation (beyond schema) for race logic.
-    Returns 'OK' or a multi-line report of errors/warnings.
-    """
-    try:
-        data = yaml.safe_load(yaml_text)
-    except Exception as e:
-        return f"YAML parse error: {e}"
-
+def _completeness_issue(data):
+    """Return None if all required top-level sections are present, else the problem."""
+    required = [
+        "version",
+        "metadata",
+        "assumptions",
+        "user_view",
+        "stints",
+        "pit_ops",
+        "costs",
+    ]
+    missing = [s for s in required if s not in data]
+    if missing:
+        return f"Missing sections: {', '.join(missing)}"
+
+    # Also check if stints is properly populated
+    if "stints" in data and (not data["stints"] or len(data["stints"]) == 0):
+        return "stints section is empty"
+    return None
+
+
+def _domain_issues(data):
+    """Return (errors, warnings) for race logic; raises if required fields are unreadable."""
     errors = []
     warnings = []
 
-    try:
-        track = data["metadata"]["track"]
-        total_laps = int(track["laps"])
-        constraints = data.get("assumptions", {}).get("constraints", {}) or {}
-        inv = data.get("assumptions", {}).get("tire_availability", {}) or {}
-        allow_used = bool(constraints.get("allow_used_tyre", False))
-        min_compounds = int(constraints.get("min_compounds_required", 0))
-        max_pitstops = int(constraints.get("max_pitstops", 99))
-        stints = data.get("stints", []) or []
-        user_view = data.get("user_view", {}) or {}
-        uv_pit_laps = list(user_view.get("planned_pit_laps", []) or [])
-    except Exception as e:
-        return f"Domain parse error: {e}"
+    track = data["metadata"]["track"]
+    total_laps = int(track["laps"])
+    constraints = data.get("assumptions", {}).get("constraints", {}) or {}
+    inv = data.get("assumptions", {}).get("tire_availability", {}) or {}
+    allow_used = bool(constraints.get("allow_used_tyre", False))
+    min_compounds = int(constraints.get("min_compounds_required", 0))
+    max_pitstops = int(constraints.get("max_pitstops", 99))
+    stints = data.get("stints", []) or []
+    user_view = data.get("user_view", {}) or {}
+    uv_pit_laps = list(user_view.get("planned_pit_laps", []) or [])
 
     # 1) ≥ 2 stints unless explicit wet exemption
     compounds = [s.get("compound", "").strip() for s in stints]
@@ -235,6 +295,35 @@ def domain_validate_strategy(yaml_text: str) -> str:
                     f"Dry stint {comp} length {tlen} laps > 70% of race; likely unrealistic."
                 )
 
+    return errors, warnings
+
+
+@tool("check_yaml_completeness", return_direct=False)
+def check_yaml_completeness(yaml_text: str) -> str:
+    """Check if YAML has all required top-level sections."""
+    try:
+        issue = _completeness_issue(parse_strategy_yaml(yaml_text))
+    except Exception as e:
+        return f"PARSE ERROR: {e}"
+    return "COMPLETE" if issue is None else f"INCOMPLETE: {issue}"
+
+
+@tool("domain_validate_strategy", return_direct=False)
+def domain_validate_strategy(yaml_text: str) -> str:
+    """
+    Domain-level validation (beyond schema) for race logic.
+    Returns 'OK' or a multi-line report of errors/warnings.
+    """
+    try:
+        data = parse_strategy_yaml(yaml_text)
+    except Exception as e:
+        return f"YAML parse error: {e}"
+
+    try:
+        errors, warnings = _domain_issues(data)
+    except Exception as e:
+        return f"Domain parse error: {e}"
+
     if errors:
         return (
             "ERRORS:\n- "
@@ -246,6 +335,48 @@ def domain_validate_strategy(yaml_text: str) -> str:
     return "OK"
 
 
+@tool("validate_strategy_full", return_direct=False)
+def validate_strategy_full(yaml_text: str) -> str:
+    """
+    Run completeness, JSON-schema (every error) and domain checks on one parse of the YAML.
+    Returns a compact JSON report: {"ok", "parse_error", "incomplete", "schema_errors", "domain_errors", "warnings"}.
+    """
+    report = {
+        "ok": False,
+        "parse_error": None,
+        "incomplete": None,
+        "schema_errors": [],
+        "domain_errors": [],
+        "warnings": [],
+    }
+    try:
+        data = parse_strategy_yaml(yaml_text)
+        if not isinstance(data, dict):
+            raise ValueError("document is not a mapping")
+    except Exception as e:
+        report["parse_error"] = str(e)
+        return json.dumps(report, ensure_ascii=False, separators=(",", ":"))
+
+    report["incomplete"] = _completeness_issue(data)
+
+    validator = get_schema_validator()
+    if validator is None:
+        report["schema_errors"].append({"path": "$", "message": "strategy.schema.json not found."})
+    else:
+        for e in sorted(validator.iter_errors(data), key=lambda e: list(map(str, e.path))):
+            report["schema_errors"].append({"path": _json_path(e), "message": e.message})
+
+    try:
+        report["domain_errors"], report["warnings"] = _domain_issues(data)
+    except Exception as e:
+        report["domain_errors"].append(f"Domain parse error: {e}")
+
+    report["ok"] = not (
+        report["incomplete"] or report["schema_errors"] or report["domain_errors"]
+    )
+    return json.dumps(report, ensure_ascii=False, separators=(",", ":"))
+
+
 @tool("structured_strategy_response", return_direct=True)
 def structured_strategy_response(strategy_name: str, description: str) -> str:
     """
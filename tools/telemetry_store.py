@@ -0,0 +1,176 @@
+import os
+import shutil
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Per-lap telemetry extracted from FastF1 sessions, one directory per
+# session and driver, one .npy file per channel. Laps are concatenated;
+# laps.npy holds (start, stop) row offsets in the driver's lap order, so
+# row i matches session.laps.pick_driver(driver).iloc[i].
+STORE_DIR = os.getenv("TELEMETRY_STORE_DIR") or os.path.expanduser(
+    "~/.cache/hacktx25/telemetry"
+)
+INDEX_FILE = "laps.npy"
+
+# Stored channels and their on-disk dtype. Times are float32 seconds and
+# integer channels use -1 for missing samples.
+STORE_CHANNELS = {
+    "SessionTime": np.float32,
+    "Time": np.float32,
+    "Speed": np.float32,
+    "RPM": np.float32,
+    "nGear": np.int16,
+    "Throttle": np.float32,
+    "Brake": np.int16,
+    "DRS": np.int16,
+    "X": np.float32,
+    "Y": np.float32,
+    "Z": np.float32,
+    "Distance": np.float32,
+    "RelativeDistance": np.float32,
+    "DriverAhead": np.int16,
+    "DistanceToDriverAhead": np.float32,
+}
+TIME_CHANNELS = ("SessionTime", "Time")
+# Lap-level columns (one value per lap, from session.laps) that share a name
+# with a telemetry channel; fastf1_telemetry returns them in its lap Series.
+# Stored as lap_<name>.npy, float64 seconds.
+LAP_FIELDS = ("Time",)
+
+
+def session_dir(year: int, event: str, session_name: str, root: str = STORE_DIR) -> str:
+    return os.path.join(root, f"{year}_{event}_{session_name}".replace(" ", "_"))
+
+
+def _encode(column: pd.Series, dtype) -> np.ndarray:
+    """Convert one telemetry column to its on-disk dtype."""
+    if pd.api.types.is_timedelta64_dtype(column):
+        column = column.dt.total_seconds()
+    column = pd.to_numeric(column, errors="coerce")
+    if np.issubdtype(dtype, np.integer):
+        return column.fillna(-1).to_numpy().astype(dtype)
+    return column.to_numpy(dtype=dtype)
+
+
+def extract_session(session, year: int, event: str, session_name: str, root: str = STORE_DIR) -> str:
+    """Write every driver's per-lap telemetry from a loaded session to the store.
+
+    The session must have laps and telemetry loaded. The session directory
+    is built next to the old one and swapped in, so readers never see a
+    partial extraction. Returns the session directory.
+    """
+    target = session_dir(year, event, session_name, root)
+    staging = target + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    for driver in session.laps["Driver"].dropna().unique():
+        laps = session.laps.pick_driver(driver)
+        columns = {name: [] for name in STORE_CHANNELS}
+        offsets = np.zeros((len(laps), 2), dtype=np.int64)
+        rows = 0
+        for i in range(len(laps)):
+            try:
+                telemetry = laps.iloc[i].get_telemetry().add_distance()
+            except Exception:
+                # No telemetry for this lap; leave an empty slice.
+                telemetry = pd.DataFrame()
+            for name, dtype in STORE_CHANNELS.items():
+                if name in telemetry.columns:
+                    columns[name].append(_encode(telemetry[name], dtype))
+                else:
+                    columns[name].append(np.full(len(telemetry), -1, dtype=dtype))
+            offsets[i] = (rows, rows + len(telemetry))
+            rows += len(telemetry)
+
+        path = os.path.join(staging, str(driver))
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, INDEX_FILE), offsets)
+        for name in LAP_FIELDS:
+            np.save(os.path.join(path, f"lap_{name}.npy"), _encode(laps[name], np.float64))
+        for name, dtype in STORE_CHANNELS.items():
+            data = np.concatenate(columns[name]) if columns[name] else np.empty(0, dtype)
+            np.save(os.path.join(path, f"{name}.npy"), data)
+
+    old = target + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.isdir(target):
+        os.replace(target, old)
+    os.makedirs(staging, exist_ok=True)
+    os.replace(staging, target)
+    shutil.rmtree(old, ignore_errors=True)
+    _open_driver.cache_clear()
+    return target
+
+
+@lru_cache(maxsize=128)
+def _open_driver(path: str, mtime_ns: int):
+    """Memory-map one driver's index and channels; `mtime_ns` keys re-extractions apart."""
+    columns = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in STORE_CHANNELS
+    }
+    # Stores extracted before lap fields were added simply lack them.
+    fields = {
+        name: np.load(os.path.join(path, f"lap_{name}.npy"))
+        for name in LAP_FIELDS
+        if os.path.exists(os.path.join(path, f"lap_{name}.npy"))
+    }
+    return np.load(os.path.join(path, INDEX_FILE), mmap_mode="r"), columns, fields
+
+
+def open_driver(year: int, event: str, session_name: str, driver: str, root: str = STORE_DIR):
+    """Return (lap offsets, {channel: memmap}, {lap field: array}) for one driver, or None.
+
+    Misses are not cached, so a store extracted by another process is picked
+    up on the next call; a re-extraction changes the index mtime and remaps.
+    """
+    path = os.path.join(session_dir(year, event, session_name, root), driver)
+    try:
+        mtime_ns = os.stat(os.path.join(path, INDEX_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _open_driver(path, mtime_ns)
+
+
+def read_lap(year: int, event: str, session_name: str, driver: str, lap_idx: int, channels):
+    """Return a DataFrame of `channels` for one lap from the store, or None if not extracted.
+
+    Numeric channels are views into the memory-mapped files; time channels
+    are converted back to timedeltas.
+    """
+    opened = open_driver(year, event, session_name, driver)
+    if opened is None:
+        return None
+    offsets, columns, _ = opened
+    start, stop = (int(x) for x in offsets[lap_idx])
+    data = {}
+    for name in channels:
+        values = columns[name][start:stop]
+        data[name] = pd.to_timedelta(values, unit="s") if name in TIME_CHANNELS else values
+    return pd.DataFrame(data, copy=False)
+
+
+def read_lap_fields(year: int, event: str, session_name: str, driver: str, lap_idx: int, channels):
+    """Return a Series of the LAP_FIELDS in `channels` for one lap, or None if not stored."""
+    opened = open_driver(year, event, session_name, driver)
+    if opened is None:
+        return None
+    fields = opened[2]
+    wanted = [name for name in channels if name in LAP_FIELDS]
+    if not set(wanted) <= fields.keys():
+        return None
+    return pd.Series(
+        {name: pd.to_timedelta(fields[name][lap_idx], unit="s") for name in wanted}, dtype=object
+    )
+
+
+if __name__ == "__main__":
+    # Usage: python -m tools.telemetry_store 2023 "Spanish" Race
+    from tools.fastf1 import _set_cache_dir, load_session
+
+    year, event, session_name = int(sys.argv[1]), sys.argv[2], sys.argv[3]
+    _set_cache_dir()
+    session = load_session(year, event, session_name, components=("laps", "telemetry"))
+    print(f"Extracted telemetry to {extract_session(session, year, event, session_name)}")
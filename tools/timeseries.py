@@ -0,0 +1,141 @@
+import numpy as np
+from langchain_core.tools import tool
+
+from db import get_connection
+from tools.db import _begin_guarded, encode_csv
+from tools.rollups import METRICS_TABLE, TIME_COLUMN, VALUE_COLUMN
+
+MAX_POINTS = 2000
+# LTTB runs over an M4 pre-reduction with this many buckets per output point.
+M4_BUCKETS_PER_POINT = 2
+
+# M4: per time bucket keep the first, last, min and max sample. Any line
+# drawn through the result has the same extremes as the raw series, and at
+# most 4 rows per bucket leave the database.
+M4_SQL = f"""
+WITH bounds AS (
+    SELECT coalesce(%(start)s::timestamptz, min({TIME_COLUMN})) AS lo,
+           coalesce(%(end)s::timestamptz, max({TIME_COLUMN})) AS hi
+    FROM {METRICS_TABLE} WHERE sensor_name = %(sensor)s
+), pts AS (
+    SELECT m.{TIME_COLUMN} AS t, m.{VALUE_COLUMN} AS v,
+           width_bucket(extract(epoch FROM m.{TIME_COLUMN}),
+                        extract(epoch FROM b.lo), extract(epoch FROM b.hi) + 1e-6,
+                        %(buckets)s) AS bucket
+    FROM {METRICS_TABLE} m, bounds b
+    WHERE m.sensor_name = %(sensor)s AND m.{TIME_COLUMN} BETWEEN b.lo AND b.hi
+      AND m.{VALUE_COLUMN} IS NOT NULL
+), m4 AS (
+    SELECT count(*) AS n,
+           (array_agg(t ORDER BY t))[1] AS t1, (array_agg(v ORDER BY t))[1] AS v1,
+           (array_agg(t ORDER BY t DESC))[1] AS t2, (array_agg(v ORDER BY t DESC))[1] AS v2,
+           (array_agg(t ORDER BY v, t))[1] AS t3, min(v) AS v3,
+           (array_agg(t ORDER BY v DESC, t))[1] AS t4, max(v) AS v4
+    FROM pts GROUP BY bucket
+)
+SELECT n, t, extract(epoch FROM t) AS x, v
+FROM m4, LATERAL (VALUES (t1, v1), (t2, v2), (t3, v3), (t4, v4)) AS p(t, v);
+"""
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Return indices of the Largest-Triangle-Three-Buckets subsample of (x, y).
+
+    `x` must be sorted. Keeps the first and last point and, from each of
+    `threshold - 2` equal-count buckets, the point forming the largest
+    triangle with the previously kept point and the next bucket's centroid.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_envelope(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Return indices of the min and max point of each of `threshold // 2` equal-time buckets."""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    buckets = max(threshold // 2, 1)
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, buckets - 1)
+    # Stable sort by (bucket, y): first and last of each run are the min and max.
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.r_[order[starts], order[ends]])
+
+
+def downsample_series(sensor: str, points: int, start=None, end=None, method: str = "lttb"):
+    """Return (times, values, raw_count) for `sensor`, reduced to at most `points` samples."""
+    points = max(3, min(int(points), MAX_POINTS))
+    buckets = points * M4_BUCKETS_PER_POINT if method == "lttb" else max(points // 2, 1)
+    with get_connection() as conn:
+        _begin_guarded(conn)
+        with conn.cursor() as cur:
+            cur.execute(M4_SQL, {"sensor": sensor, "start": start, "end": end, "buckets": buckets})
+            rows = cur.fetchall()
+    if not rows:
+        return [], np.empty(0), 0
+
+    counts, times, x, y = zip(*rows)
+    # Each bucket contributes four rows carrying its sample count.
+    raw_count = int(sum(counts) // 4)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    order = np.argsort(x, kind="stable")
+    x, y = x[order], y[order]
+    times = [times[i] for i in order]
+    _, first = np.unique(x, return_index=True)
+    x, y, times = x[first], y[first], [times[i] for i in first]
+
+    keep = lttb(x, y, points) if method == "lttb" else minmax_envelope(x, y, points)
+    return [times[i] for i in keep], y[keep], raw_count
+
+
+## -------- Tools ----------
+
+
+@tool("downsample_sensor", return_direct=False)
+def downsample_sensor(
+    sensor_name: str, start: str = "", end: str = "", points: int = 300, method: str = "lttb"
+) -> str:
+    """Return a shape-preserving downsample of one metrics sensor over a time range.
+
+    Peaks, dips and cliffs survive in a fixed number of points, so prefer this
+    over run_sql_query for looking at a long sensor trace.
+
+    Args:
+        sensor_name: metrics.sensor_name to sample.
+        start: optional ISO timestamp; defaults to the sensor's first sample.
+        end: optional ISO timestamp; defaults to the sensor's last sample.
+        points: number of points to return (3..2000).
+        method: "lttb" (Largest-Triangle-Three-Buckets) or "minmax" (per-bucket envelope).
+    Returns:
+        CSV of time,value preceded by the raw sample count.
+    """
+    if method not in ("lttb", "minmax"):
+        return "DOWNSAMPLE ERROR: method must be 'lttb' or 'minmax'."
+    try:
+        times, values, raw_count = downsample_series(
+            sensor_name, points, start or None, end or None, method
+        )
+    except Exception as e:
+        return f"Failed to downsample sensor: {str(e)}"
+    if not times:
+        return f"No samples for sensor '{sensor_name}' in the requested range."
+    records = [{"time": t, "value": v} for t, v in zip(times, values.tolist())]
+    text, _, _ = encode_csv([records], max_rows=len(records), max_chars=len(records) * 64)
+    header = f"# {sensor_name}: {raw_count} raw samples -> {len(records)} points ({method})"
+    return header + "\n" + text